@@ -2,6 +2,33 @@
 import socket
 import subprocess
 import os
+import tempfile
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def env_kb(name, default, minimum=1):
+    """Reads a size in KB from an environment variable and returns it in bytes.
+
+    Invalid values (not a number, or below `minimum`) fall back to `default`:
+    a read size of 0 would make the receive loop stop making progress.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default * 1024
+    try:
+        kb = int(value)
+    except ValueError:
+        kb = minimum - 1
+    if kb < minimum:
+        print(f"WARN: {name}={value} is invalid (at least {minimum} KB). Using {default} KB.")
+        kb = default
+    return kb * 1024
 
 # --- Configuration ---
 # "Nếu có bất kỳ kết nối nào đến cổng 6789 trên bất kỳ địa chỉ IP nào của máy này (Droplet), hãy chuyển kết nối đó cho tôi."
@@ -9,146 +36,839 @@ HOST = '0.0.0.0'  # Listen on all available network interfaces
 PORT = 6789         # Port to listen on
 TEMP_DIR = "temp_scans"
 
+# "auto": dùng clamd nếu daemon đang chạy, nếu không thì quay về clamscan.
+# Các giá trị khác: "clamd", "clamscan", "fake" (dùng cho test, không cần cài ClamAV).
+SCAN_ENGINE = os.environ.get("CLAMAV_AGENT_ENGINE", "auto")
+CLAMD_SOCKET = "/var/run/clamav/clamd.ctl"  # Unix socket mặc định của clamav-daemon trên Ubuntu
+CLAMD_HOST = "127.0.0.1"                     # Dùng TCP nếu không có Unix socket (ví dụ trên Windows)
+CLAMD_PORT = 3310
+CLAMD_TIMEOUT = 60                           # Seconds to wait for clamd before giving up
+CLAMD_CHUNK_SIZE = 64 * 1024                 # Size of each INSTREAM chunk sent to clamd
+
+# --- Concurrency / admission control ---
+# Kết nối được xử lý bởi một event loop asyncio duy nhất; chỉ phần quét (CPU-bound) chạy trong thread pool.
+MAX_WORKERS = os.cpu_count() or 4  # Số file được quét song song (số luồng của scan executor)
+IO_WORKERS = 32                    # Threads forwarding received data into scan streams (no scan slot needed)
+MAX_ENGINE_STREAMS = 16            # Engine streams (clamd INSTREAM connections) open while uploads still arrive
+MAX_QUEUE = 1000                   # Số upload được nhận thêm trong khi chờ worker rảnh
+MAX_CONNECTIONS = 4096             # Số kết nối mở cùng lúc (kể cả chưa gửi metadata)
+LISTEN_BACKLOG = 128               # Kernel accept backlog
+BUSY_RETRY_AFTER = 5               # Seconds a rejected client should wait before retrying
+CLIENT_TIMEOUT = 300               # Drop a client that sends nothing for this many seconds
+# Kích thước buffer nhận, đổi bằng biến môi trường (giống chunk_size_kb, max_chunk_size_kb,
+# adaptive_chunks, socket_buffer_kb trong config.ini của client)
+RECV_SIZE = env_kb("CLAMAV_AGENT_RECV_KB", 64)                   # Bytes read from a client per read call
+MAX_RECV_SIZE = env_kb("CLAMAV_AGENT_MAX_RECV_KB", 1024)         # Upper bound in adaptive mode
+ADAPTIVE_RECV = os.environ.get("CLAMAV_AGENT_ADAPTIVE", "yes").lower() not in ("0", "no", "off", "false")
+SOCKET_BUFFER = env_kb("CLAMAV_AGENT_SOCKET_BUFFER_KB", 0, minimum=0)  # SO_RCVBUF/SO_SNDBUF (0 = OS default)
+ADAPT_INTERVAL = 0.2               # Seconds between read size adjustments in adaptive mode
+ADAPT_TARGET = 0.01                # Adaptive mode sizes a read to about this many seconds of throughput
+STREAM_BUFFER_LIMIT = 1024 * 1024  # Uploads up to this size are buffered in memory before scanning
+
+# --- Verdict cache ---
+# Kết quả quét được lưu theo SHA-256 của nội dung file + phiên bản signature database,
+# file đã quét rồi thì trả kết quả ngay không cần quét lại.
+VERDICT_CACHE_FILE = "verdict_cache.jsonl"  # Append-only log, survives restarts ("" = memory only)
+VERDICT_CACHE_SIZE = 100000                 # Maximum number of cached verdicts (LRU eviction)
+VERDICT_CACHE_TTL = 7 * 24 * 3600           # Seconds a verdict stays valid
+SIGNATURE_CHECK_INTERVAL = 60               # Seconds between signature version checks
+# "HASH <sha256> <size>"; metadata khác (kể cả file tên "HASH ...:size" của client cũ) là "filename:size"
+HASH_REQUEST = re.compile(r'HASH ([0-9a-fA-F]{64}) (\d+)')
+
 def setup_environment():
     """Create the temporary directory for file scans if it doesn't exist."""
     if not os.path.exists(TEMP_DIR):
         os.makedirs(TEMP_DIR)
         print(f"Created temporary scan directory: {TEMP_DIR}")
 
-def scan_file(file_path):
+
+class ChunkSizer:
+    """Chooses how many bytes the receive loop asks for per read.
+
+    Same rule as the client's ChunkSizer: in adaptive mode the size is
+    re-evaluated every ADAPT_INTERVAL seconds so that one read carries about
+    ADAPT_TARGET seconds of the observed throughput, between `size` and
+    `maximum`.
     """
-    Scans a file using the real clamscan command and checks its exit code.
+
+    def __init__(self, size=RECV_SIZE, maximum=MAX_RECV_SIZE, adaptive=ADAPTIVE_RECV):
+        self.minimum = size
+        self.maximum = max(size, maximum)
+        self.size = size
+        self.adaptive = adaptive
+        self.window_bytes = 0
+        self.window_start = time.monotonic()
+
+    def record(self, nbytes):
+        """Accounts for nbytes received, adjusting size in adaptive mode."""
+        if not self.adaptive:
+            return
+        self.window_bytes += nbytes
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed < ADAPT_INTERVAL:
+            return
+        target = self.window_bytes / elapsed * ADAPT_TARGET
+        size = self.minimum
+        while size < target and size < self.maximum:
+            size *= 2
+        self.size = min(size, self.maximum)
+        self.window_bytes = 0
+        self.window_start = now
+
+
+class ScanStream:
+    """An in-progress scan that receives the file data chunk by chunk.
+
+    Usage: call write() for every received chunk, then finish() to get the
+    result string, or abort() if the upload was cut short.
     """
-    # Ensure the file exists before scanning
-    if not os.path.exists(file_path):
-        print(f"ERROR: File does not exist at path: {file_path}")
-        return "ERROR: File not found for scanning"
-    
-    try:
-        # clamscan là executable program, một phần của bộ công cụ chống virus ClamAV, được cài đặt trên hệ điều hành của máy
-        # Cần một cách để chạy chương trình đó từ bên ngoài và tương tác với nó: Module subprocess của Python
-        result = subprocess.run(
-            # '--no-summary': không in ra bản tóm tắt kết quả
-            # User chỉ quan tâm OK hay INJECTED
-            ['clamscan', '--no-summary', file_path],
-            # True: Save stdout và stderr của clamscan vào result. Nếu cần debug
-            capture_output=True,
-            # Save đưới dạng string (False thì byte)
-            text=True
-        )
-
-        # Check the return code from clamscan
-        if result.returncode == 0:
-            return "OK"
-        # Virus found
-        elif result.returncode == 1:
-            return "INFECTED"
-        # Any other non-zero return code is an error
+
+    def write(self, chunk):
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+    def abort(self):
+        pass
+
+
+class SpoolStream(ScanStream):
+    """Spills the stream to a temp file and scans it with engine.scan_file().
+
+    Used by engines that need a file on disk (clamscan), and by the agent
+    for large uploads when MAX_ENGINE_STREAMS engine streams are already open.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        fd, self.path = tempfile.mkstemp(dir=TEMP_DIR, suffix=".scan")
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def finish(self):
+        self.file.close()
+        try:
+            return self.engine.scan_file(self.path)
+        finally:
+            self.abort()
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ScanEngine:
+    """Base class for the virus scanners the agent can delegate to.
+
+    Every engine returns the same strings the agent sends back to the client:
+    "OK", "INFECTED" or "ERROR: <reason>".
+    """
+    name = "base"
+
+    def scan_file(self, file_path):
+        """Scans a file on disk and returns the scan result string."""
+        raise NotImplementedError
+
+    def open_stream(self):
+        """Starts a streaming scan. Engines that cannot stream spill to a temp file."""
+        return SpoolStream(self)
+
+    def signature_version(self):
+        """Returns the engine + signature database version, or None if unknown.
+
+        Cached verdicts are only reused while this value stays the same.
+        """
+        return None
+
+
+def parse_clamav_version(text):
+    """Extracts 'ClamAV <engine>/<database>' from a clamd/clamscan version string.
+
+    For example "ClamAV 1.0.0/27000/Mon Jan  1 00:00:00 2026" -> "ClamAV 1.0.0/27000".
+    """
+    parts = text.strip().split('/')
+    if len(parts) < 2:
+        return None
+    return '/'.join(parts[:2])
+
+
+class ClamdScanner(ScanEngine):
+    """Scans through a resident clamd daemon.
+
+    clamd keeps the signature database loaded in memory, so a scan costs one
+    local socket round trip instead of a new clamscan process that reloads
+    every signature. Data is sent with the INSTREAM command, so clamd does
+    not need read access to the agent's files.
+    """
+    name = "clamd"
+
+    def __init__(self, socket_path=CLAMD_SOCKET, host=CLAMD_HOST, port=CLAMD_PORT, timeout=CLAMD_TIMEOUT):
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _connect(self):
+        """Opens a new connection to clamd (Unix socket first, then TCP)."""
+        if self.socket_path and hasattr(socket, 'AF_UNIX') and os.path.exists(self.socket_path):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = self.socket_path
         else:
-            print(f"ERROR: Clamscan failed with error code {result.returncode} for file {file_path}.")
-            print(f"ERROR: Clamscan stderr: {result.stderr.strip()}")
-            return "ERROR: Scan failed"
-
-    except FileNotFoundError:
-        print("ERROR: `clamscan` command not found. Please ensure ClamAV is installed and in your system's PATH.")
-        return "ERROR: clamscan not found"
-    except Exception as e:
-        print(f"ERROR: An unexpected error occurred during scan: {e}")
-        return f"ERROR: {e}"
-    
-def handle_client(conn, addr):
-    """Handle a single client connection."""
-    try:
-        # 1. Receive file metadata (filename and filesize) sent by client
-        metadata = conn.recv(1024).decode()
-        if not metadata:
-            print(f"ERROR: Client {addr} connected but sent no data.")
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (self.host, self.port)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _read_reply(sock):
+        """Reads a single NUL-terminated reply (z-prefixed commands) from clamd."""
+        data = b""
+        while not data.endswith(b"\0"):
+            part = sock.recv(4096)
+            if not part:
+                break
+            data += part
+        return data.rstrip(b"\0").decode(errors='replace').strip()
+
+    def _command(self, command):
+        """Sends a simple command (PING, VERSION, ...) and returns the reply."""
+        with self._connect() as sock:
+            sock.sendall(b"z" + command.encode() + b"\0")
+            return self._read_reply(sock)
+
+    def ping(self):
+        """Returns True if clamd is reachable and answers PONG."""
+        try:
+            return self._command("PING") == "PONG"
+        except OSError:
+            return False
+
+    def signature_version(self):
+        try:
+            return parse_clamav_version(self._command("VERSION"))
+        except OSError:
+            return None
+
+    @staticmethod
+    def _parse_result(reply):
+        """Maps a clamd reply such as 'stream: OK' to the agent's result strings."""
+        if reply.endswith("FOUND"):
+            return "INFECTED"
+        if reply.endswith("OK"):
+            return "OK"
+        print(f"ERROR: clamd returned: {reply}")
+        return "ERROR: Scan failed"
+
+    def scan_file(self, file_path):
+        if not os.path.exists(file_path):
+            print(f"ERROR: File does not exist at path: {file_path}")
+            return "ERROR: File not found for scanning"
+        try:
+            stream = self.open_stream()
+        except Exception as e:
+            print(f"ERROR: clamd scan failed: {e}")
+            return f"ERROR: {e}"
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(CLAMD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                stream.write(chunk)
+        return stream.finish()
+
+    def open_stream(self):
+        return ClamdStream(self)
+
+
+class ClamdStream(ScanStream):
+    """Forwards received chunks straight to clamd as INSTREAM chunks."""
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.sock = scanner._connect()
+        self.error = None
+        self.sock.sendall(b"zINSTREAM\0")
+
+    def write(self, chunk):
+        if self.error:
+            return
+        try:
+            # Mỗi chunk INSTREAM: 4 byte độ dài (big-endian) + dữ liệu
+            self.sock.sendall(len(chunk).to_bytes(4, 'big') + chunk)
+        except OSError as e:
+            # clamd đóng kết nối giữa chừng (ví dụ vượt StreamMaxLength), đọc lý do ở finish()
+            self.error = e
+
+    def finish(self):
+        try:
+            if not self.error:
+                # Chunk độ dài 0 báo cho clamd biết đã hết dữ liệu
+                self.sock.sendall(b"\0\0\0\0")
+            reply = self.scanner._read_reply(self.sock)
+            if not reply:
+                raise OSError(self.error or "clamd closed the connection")
+            return self.scanner._parse_result(reply)
+        except Exception as e:
+            print(f"ERROR: clamd scan failed: {e}")
+            return f"ERROR: {e}"
+        finally:
+            self.sock.close()
+
+    def abort(self):
+        self.sock.close()
+
+
+class ClamscanScanner(ScanEngine):
+    """Fallback engine that runs the clamscan command once per file.
+
+    Slow (each run reloads the whole signature database), but it works
+    without the clamd daemon.
+    """
+    name = "clamscan"
+
+    def scan_file(self, file_path):
+        """
+        Scans a file using the real clamscan command and checks its exit code.
+        """
+        # Ensure the file exists before scanning
+        if not os.path.exists(file_path):
+            print(f"ERROR: File does not exist at path: {file_path}")
+            return "ERROR: File not found for scanning"
+
+        try:
+            # clamscan là executable program, một phần của bộ công cụ chống virus ClamAV, được cài đặt trên hệ điều hành của máy
+            # Cần một cách để chạy chương trình đó từ bên ngoài và tương tác với nó: Module subprocess của Python
+            result = subprocess.run(
+                # '--no-summary': không in ra bản tóm tắt kết quả
+                # User chỉ quan tâm OK hay INJECTED
+                ['clamscan', '--no-summary', file_path],
+                # True: Save stdout và stderr của clamscan vào result. Nếu cần debug
+                capture_output=True,
+                # Save đưới dạng string (False thì byte)
+                text=True
+            )
+
+            # Check the return code from clamscan
+            if result.returncode == 0:
+                return "OK"
+            # Virus found
+            elif result.returncode == 1:
+                return "INFECTED"
+            # Any other non-zero return code is an error
+            else:
+                print(f"ERROR: Clamscan failed with error code {result.returncode} for file {file_path}.")
+                print(f"ERROR: Clamscan stderr: {result.stderr.strip()}")
+                return "ERROR: Scan failed"
+
+        except FileNotFoundError:
+            print("ERROR: `clamscan` command not found. Please ensure ClamAV is installed and in your system's PATH.")
+            return "ERROR: clamscan not found"
+        except Exception as e:
+            print(f"ERROR: An unexpected error occurred during scan: {e}")
+            return f"ERROR: {e}"
+
+
+    def signature_version(self):
+        try:
+            result = subprocess.run(['clamscan', '--version'], capture_output=True, text=True)
+            return parse_clamav_version(result.stdout)
+        except OSError:
+            return None
+
+
+class FakeScanner(ScanEngine):
+    """Test stub that needs no ClamAV installation.
+
+    Reports INFECTED when the data contains the EICAR test string and OK
+    otherwise.
+    """
+    name = "fake"
+    SIGNATURE = b"EICAR-STANDARD-ANTIVIRUS-TEST-FILE"
+
+    def scan_file(self, file_path):
+        if not os.path.exists(file_path):
+            return "ERROR: File not found for scanning"
+        with open(file_path, 'rb') as f:
+            return "INFECTED" if self.SIGNATURE in f.read() else "OK"
+
+    def open_stream(self):
+        return FakeStream(self.SIGNATURE)
+
+    def signature_version(self):
+        return "fake/1"
+
+
+class FakeStream(ScanStream):
+    """Looks for the signature across chunk boundaries without buffering the file."""
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.tail = b""
+        self.found = False
+
+    def write(self, chunk):
+        if self.found:
             return
+        window = self.tail + chunk
+        self.found = self.signature in window
+        self.tail = window[-(len(self.signature) - 1):]
+
+    def finish(self):
+        return "INFECTED" if self.found else "OK"
+
+
+def create_engine(kind=None):
+    """Creates the scan engine selected by `kind` (defaults to SCAN_ENGINE).
+
+    Args:
+        kind (str|None): "auto", "clamd", "clamscan" or "fake".
+
+    Returns:
+        ScanEngine: The engine instance.
+    """
+    kind = (kind or SCAN_ENGINE).lower()
+    if kind == "clamd":
+        return ClamdScanner()
+    if kind == "clamscan":
+        return ClamscanScanner()
+    if kind == "fake":
+        return FakeScanner()
+    if kind != "auto":
+        raise ValueError(f"Unknown scan engine: {kind}")
+
+    clamd = ClamdScanner()
+    if clamd.ping():
+        return clamd
+    print("WARN: clamd is not reachable, falling back to clamscan (slow: one process per file).")
+    return ClamscanScanner()
+
+
+# Engine dùng chung cho toàn bộ agent, được tạo một lần khi khởi động
+engine = None
+
+def get_engine():
+    """Returns the shared scan engine, creating it on first use."""
+    global engine
+    if engine is None:
+        engine = create_engine()
+    return engine
+
+def scan_file(file_path):
+    """Scans a file with the configured scan engine."""
+    return get_engine().scan_file(file_path)
+
+class VerdictCache:
+    """LRU + TTL cache of scan verdicts keyed by SHA-256 of the file content.
+
+    All entries belong to one signature version. When the engine reports a
+    new version (signatures were updated), the whole cache is dropped.
+    Entries are appended to VERDICT_CACHE_FILE as JSON lines and replayed
+    on start; the file is compacted when it grows too large. File writes
+    run in order on a dedicated writer thread, so callers on the event loop
+    never wait for the disk.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        self.path = VERDICT_CACHE_FILE if path is None else path
+        self.max_entries = max_entries or VERDICT_CACHE_SIZE
+        self.ttl = ttl or VERDICT_CACHE_TTL
+        self.version = None
+        self.entries = OrderedDict()  # sha256 -> (verdict, timestamp)
+        self.log_lines = 0
+        self.writer = ThreadPoolExecutor(max_workers=1)  # Một luồng: các lần ghi giữ đúng thứ tự
+        self._load()
+
+    def _load(self):
+        """Replays the on-disk log, keeping only entries of the newest version."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                self.log_lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Dòng bị ghi dở khi agent tắt đột ngột
+                if record.get('version') != self.version:
+                    self.version = record.get('version')
+                    self.entries.clear()
+                self._store(record['sha256'], record['verdict'], record['time'])
+        print(f"Loaded {len(self.entries)} cached verdicts for {self.version}")
+
+    def _store(self, sha256, verdict, timestamp):
+        self.entries[sha256] = (verdict, timestamp)
+        self.entries.move_to_end(sha256)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def set_version(self, version):
+        """Drops every cached verdict if the signature version changed.
+
+        None (engine version unknown) is ignored, so an engine outage does not wipe the cache.
+        """
+        if version is None or version == self.version:
+            return
+        if self.entries:
+            print(f"Signature version changed ({self.version} -> {version}), clearing verdict cache")
+        self.version = version
+        self.entries.clear()
+        self._compact()
+
+    def get(self, sha256):
+        """Returns the cached verdict for a content hash, or None."""
+        item = self.entries.get(sha256)
+        if item is None:
+            return None
+        verdict, timestamp = item
+        if time.time() - timestamp > self.ttl:
+            del self.entries[sha256]
+            return None
+        self.entries.move_to_end(sha256)
+        return verdict
+
+    def put(self, sha256, verdict):
+        """Caches a definitive verdict (OK or INFECTED) for the current version."""
+        if verdict not in ("OK", "INFECTED") or self.version is None:
+            return
+        now = time.time()
+        self._store(sha256, verdict, now)
+        if not self.path:
+            return
+        self.writer.submit(self._append, {'sha256': sha256, 'verdict': verdict,
+                                          'version': self.version, 'time': now})
+        self.log_lines += 1
+        if self.log_lines > 2 * len(self.entries) + 1000:
+            self._compact()
+
+    def flush(self):
+        """Waits until every queued write has reached the log file."""
+        self.writer.submit(lambda: None).result()
+
+    def _append(self, record):
+        """Appends one record to the log (writer thread)."""
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"ERROR: Could not write verdict cache: {e}")
+
+    def _compact(self):
+        """Rewrites the log with only the live entries (in the writer thread)."""
+        if not self.path:
+            return
+        # Chụp lại danh sách hiện tại; json.dumps và ghi file chạy trong luồng writer
+        snapshot = list(self.entries.items())
+        self.writer.submit(self._write_log, snapshot, self.version)
+        self.log_lines = len(snapshot)
+
+    def _write_log(self, snapshot, version):
+        """Replaces the log file with `snapshot` (writer thread)."""
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                for sha256, (verdict, timestamp) in snapshot:
+                    f.write(json.dumps({'sha256': sha256, 'verdict': verdict,
+                                        'version': version, 'time': timestamp}) + '\n')
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"ERROR: Could not compact verdict cache: {e}")
+
 
-        filename, filesize_str = metadata.split(':')
-        filesize = int(filesize_str)
+class AgentServer:
+    """asyncio front end of the ClamAV agent.
 
-        # Send acknowledgment to start file transfer
-        conn.sendall(b"META_OK")
+    The event loop handles every connection, so thousands of idle or slow
+    clients cost no threads. Scanning runs in a pool of MAX_WORKERS threads.
 
+    Small uploads (up to STREAM_BUFFER_LIMIT) are buffered in memory.
+    Larger uploads are streamed into the scan engine (clamd INSTREAM or a
+    spool file) by IO_WORKERS threads as they arrive. At most
+    MAX_ENGINE_STREAMS such streams are open at once, so slow clients cannot
+    pile up idle connections inside clamd; beyond that, large uploads are
+    spooled to TEMP_DIR and sent to the engine once complete. Either way an
+    upload only takes one of the MAX_WORKERS scan slots once it is complete,
+    for the scan itself, so slow clients never hold a worker.
+
+    When MAX_WORKERS + MAX_QUEUE uploads are already admitted (or
+    MAX_CONNECTIONS are open), new clients get "BUSY: retry after N" instead
+    of META_OK.
+    """
+
+    def __init__(self, host=None, port=None):
+        self.host = host or HOST
+        self.port = port or PORT
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        self.io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS)  # stream open/write/abort
+        self.scan_slots = None  # asyncio.Semaphore, created inside the running loop
+        self.stream_slots = None  # asyncio.Semaphore bounding open engine streams
+        self.connections = 0
+        self.admitted = 0
+        self.cache = VerdictCache()
+        self.version_checked_at = 0
+        self.version_known = False  # False while the engine does not report its signature version
+
+    async def _run(self, func, *args):
+        """Runs a blocking engine call in the scan executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _run_io(self, func, *args):
+        """Runs a blocking stream call (open/write/abort) in the I/O executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, func, *args)
+
+    async def _signature_version(self):
+        """Returns the current signature version, asking the engine at most every SIGNATURE_CHECK_INTERVAL.
+
+        If the engine does not answer (None, e.g. clamd restarting to reload
+        signatures), the cache keeps its last known version but None is
+        returned, so verdicts are neither served nor stored until the engine
+        reports a version again.
+        """
+        if time.time() - self.version_checked_at > SIGNATURE_CHECK_INTERVAL:
+            self.version_checked_at = time.time()
+            version = await self._run(get_engine().signature_version)
+            self.version_known = version is not None
+            if self.version_known:
+                self.cache.set_version(version)
+        return self.cache.version if self.version_known else None
+
+    async def _cache_lookup(self, sha256):
+        """Returns the cached verdict for a content hash, refreshing the signature version first."""
+        if await self._signature_version() is None:
+            return None
+        return self.cache.get(sha256)
+
+    async def _hash_lookup(self, sha256):
+        """Answers a "HASH <sha256> <size>" request with a cached verdict or UNKNOWN."""
+        verdict = await self._cache_lookup(sha256.lower())
+        if verdict:
+            print(f"Cache hit for digest {sha256[:12]}: {verdict}")
+            return verdict
+        return "UNKNOWN"
+
+    async def _read(self, reader, size):
+        """Reads up to `size` bytes, dropping clients that stay silent for CLIENT_TIMEOUT."""
+        return await asyncio.wait_for(reader.read(size), CLIENT_TIMEOUT)
+
+    async def _reject_busy(self, reader, writer, addr):
+        """Tells a client the agent is saturated.
+
+        The metadata is read first so the reply is not lost to a TCP reset
+        caused by closing a socket with unread data.
+        """
+        print(f"WARN: Agent is busy, rejecting {addr}")
+        try:
+            await asyncio.wait_for(reader.read(1024), 1)
+        except asyncio.TimeoutError:
+            pass
+        writer.write(f"BUSY: retry after {BUSY_RETRY_AFTER}".encode())
+        await writer.drain()
+
+    async def handle_client(self, reader, writer):
+        """Handle a single client connection."""
+        addr = writer.get_extra_info('peername')
+        print(f"\nAccepted connection from {addr}")
+        self.connections += 1
+        try:
+            if self.connections > MAX_CONNECTIONS:
+                await self._reject_busy(reader, writer, addr)
+                return
+
+            # 1. Receive file metadata (filename and filesize) sent by client
+            metadata = (await self._read(reader, 1024)).decode()
+            if not metadata:
+                print(f"ERROR: Client {addr} connected but sent no data.")
+                return
+
+            # "VERSION": client hỏi phiên bản signature để dùng cache cục bộ của nó
+            if metadata == "VERSION":
+                version = await self._signature_version()
+                writer.write((version or "UNKNOWN").encode())
+                await writer.drain()
+                return
+
+            # "HASH <sha256> <size>": client hỏi verdict theo hash trước khi gửi file.
+            # Biết rồi thì trả OK/INFECTED ngay; chưa biết thì trả UNKNOWN và chờ metadata như bình thường.
+            probe = HASH_REQUEST.fullmatch(metadata)
+            if probe:
+                verdict = await self._hash_lookup(probe.group(1))
+                writer.write(verdict.encode())
+                await writer.drain()
+                if verdict != "UNKNOWN":
+                    return
+                metadata = (await self._read(reader, 1024)).decode()
+                if not metadata:
+                    return
+
+            filename, filesize_str = metadata.rsplit(':', 1)
+            filesize = int(filesize_str)
+
+            # Hết chỗ: trả lời BUSY thay vì để client chờ vô hạn
+            if self.admitted >= MAX_WORKERS + MAX_QUEUE:
+                print(f"WARN: Agent is busy, rejecting {addr}")
+                writer.write(f"BUSY: retry after {BUSY_RETRY_AFTER}".encode())
+                await writer.drain()
+                return
+
+            self.admitted += 1
+            try:
+                # Send acknowledgment to start file transfer
+                writer.write(b"META_OK")
+                await writer.drain()
+                scan_result = await self._receive_and_scan(reader, filename, filesize)
+            finally:
+                self.admitted -= 1
+
+            # 4. Send result back to client
+            # encode(): Chuyển đổi result thành byte để gửi, bên client sẽ decode thành string
+            writer.write(scan_result.encode())
+            await writer.drain()
+
+        except asyncio.TimeoutError:
+            print(f"ERROR: Client {addr} timed out.")
+        except Exception as e:
+            print(f"ERROR: An error occurred with client {addr}: {e}")
+        finally:
+            # 5. Cleanup
+            self.connections -= 1
+            writer.close()
+
+    async def _receive_and_scan(self, reader, filename, filesize):
+        """Receives the file data and feeds it to the scan engine.
+
+        Returns:
+            str: The scan result ("OK", "INFECTED" or "ERROR: ...").
+        """
         # 2. Receive file data
-        # Create a temporary file in the TEMP_DIR for scanning
-        temp_file_path = os.path.join(TEMP_DIR, os.path.basename(filename))
-        # Write binary
-        with open(temp_file_path, 'wb') as f:
-            received_bytes = 0
+        # Dữ liệu nhận được đưa thẳng vào scan engine (không ghi ra đĩa),
+        # trừ khi engine cần file trên đĩa (clamscan) thì stream tự ghi ra TEMP_DIR.
+        # Dữ liệu đã nhận nhưng chưa đưa vào engine; bytearray nối tại chỗ, không cần join cuối cùng
+        pending = bytearray()
+        stream = None
+        slot_taken = False
+        stream_slot_taken = False
+        received_bytes = 0
+        # Tính SHA-256 ngay trong lúc nhận để tra verdict cache
+        hasher = hashlib.sha256()
+        sizer = ChunkSizer(RECV_SIZE, MAX_RECV_SIZE, ADAPTIVE_RECV)
+        try:
             while received_bytes < filesize:
-                # Đọc tối đa 4096 byte (BUFFER_SIZE) từ socket trong mỗi lần gọi
-                data = conn.recv(4096)
-                # Kiểm tra nếu `data` rỗng có nghĩa là kết nối đã bị đóng đột ngột từ phía client.
+                data = await self._read(reader, min(sizer.size, filesize - received_bytes))
+                # `data` rỗng có nghĩa là kết nối đã bị đóng đột ngột từ phía client.
                 if not data:
                     break
-                # Write data vào temp file
-                f.write(data)
                 received_bytes += len(data)
-        
-        # Check xem đã nhận đầy đủ file
-        if received_bytes == filesize:
-            # 3. Scan the temporary file
-            # Nếu temp file an toàn thì file của client cũng an toàn và có thể up lên FTP server
+                sizer.record(len(data))
+                hasher.update(data)
+                if stream is None:
+                    pending += data
+                    if len(pending) < STREAM_BUFFER_LIMIT:
+                        continue
+                    # File lớn: bắt đầu stream vào engine. Chưa cần scan slot, chỉ lấy khi quét (finish).
+                    # Đã đủ MAX_ENGINE_STREAMS stream mở thì ghi tạm ra đĩa, không mở thêm kết nối tới clamd.
+                    if self.stream_slots.locked():
+                        stream = await self._run_io(SpoolStream, get_engine())
+                    else:
+                        await self.stream_slots.acquire()
+                        stream_slot_taken = True
+                        stream = await self._run_io(get_engine().open_stream)
+                    data, pending = pending, bytearray()
+                await self._run_io(stream.write, data)
+
+            # Check xem đã nhận đầy đủ file
+            if received_bytes != filesize:
+                print(f"ERROR: File transfer incomplete for '{filename}'. Expected {filesize}, got {received_bytes}")
+                if stream:
+                    await self._run_io(stream.abort)
+                return "ERROR: Incomplete file transfer"
+
+            # Cache hit: trả kết quả ngay. Với file lớn, clamd chỉ quét sau khi nhận hết stream,
+            # nên abort stream lúc này vẫn bỏ qua được toàn bộ việc quét.
+            sha256 = hasher.hexdigest()
+            cached = await self._cache_lookup(sha256)
+            if cached:
+                print(f"Cache hit for '{filename}' ({sha256[:12]}): {cached}")
+                if stream:
+                    await self._run_io(stream.abort)
+                return cached
+
+            # 3. Finish the scan
             # - Tính toàn vẹn của dữ liệu: Bạn phải đảm bảo rằng quá trình truyền file từ client đến ClamAV agent không làm hỏng dữ liệu. 
             # Việc sử dụng TCP/IP (socket.SOCK_STREAM) đã cung cấp độ tin cậy cao về tính toàn vẹn.
             # - File gốc trên client không bị thay đổi hoặc nhiễm virus giữa thời điểm quét và thời điểm tải lên FTP server. 
             # Trong hầu hết các trường hợp, khoảng thời gian này là rất ngắn.
-            scan_result = scan_file(temp_file_path)
+            await self.scan_slots.acquire()
+            slot_taken = True
+            if stream is None:
+                result = await self._run(self._scan_buffered, pending)
+            else:
+                result = await self._run(stream.finish)
+                stream = None  # finish() đã dọn dẹp stream
+            if self.version_known:
+                self.cache.put(sha256, result)
+            return result
+        except BaseException:
+            if stream:
+                await self._run_io(stream.abort)
+            raise
+        finally:
+            if slot_taken:
+                self.scan_slots.release()
+            if stream_slot_taken:
+                self.stream_slots.release()
 
-            # 4. Send result back to client
-            # encode(): Chuyển đổi result thành byte để gửi, bên client sẽ decode thành string
-            conn.sendall(scan_result.encode())
-        else:
-            print(f"ERROR: File transfer incomplete for '{filename}'. Expected {filesize}, got {received_bytes}")
-            conn.sendall(b"ERROR: Incomplete file transfer")
+    @staticmethod
+    def _scan_buffered(data):
+        """Scans an upload that was fully buffered in memory."""
+        stream = get_engine().open_stream()
+        try:
+            if data:
+                stream.write(data)
+        except Exception:
+            stream.abort()
+            raise
+        return stream.finish()
+
+    async def serve(self):
+        """Starts listening and serves clients until cancelled."""
+        self.scan_slots = asyncio.Semaphore(MAX_WORKERS)
+        self.stream_slots = asyncio.Semaphore(MAX_ENGINE_STREAMS)
+        # limit: StreamReader chỉ dừng đọc socket khi buffer vượt 2*limit, đủ chỗ cho một lần đọc lớn nhất
+        server = await asyncio.start_server(
+            self.handle_client, self.host, self.port,
+            backlog=LISTEN_BACKLOG, reuse_address=True, limit=MAX_RECV_SIZE)
+        if SOCKET_BUFFER > 0:
+            # Socket được accept kế thừa kích thước buffer của socket lắng nghe
+            for sock in server.sockets:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        print(f"ClamAV Agent listening on {self.host}:{self.port} ({MAX_WORKERS} workers, queue {MAX_QUEUE})")
+        async with server:
+            await server.serve_forever()
 
-    except Exception as e:
-        print(f"ERROR: An error occurred with client {addr}: {e}")
-    finally:
-        # 5. Cleanup
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        conn.close()
-        
 def main():
     """Main function to run the ClamAV agent server."""
     # Create temp_scans directory
     setup_environment()
-    print(f"ClamAV Agent listening on {HOST}:{PORT}")
-
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        # Lắng nghe trên 0.0.0.0 6789
-        s.listen()
-
-        while True:
-            try:
-                # Chương trình sẽ bị chặn đến khi một client thực hiện một yêu cầu kết nối thành công.
-                # Improvement: Sử dụng threading để xử lý nhiều client cùng lúc
-                # conn, addr = s.accept()
-                # handle_client(conn, addr)
-                conn, addr = s.accept()
-                print(f"\nAccepted connection from {addr}")
-                
-                
-                # [1] Tạo một đối tượng luồng mới
-                client_thread = threading.Thread(
-                    target=handle_client, # Hàm mà luồng sẽ chạy
-                    args=(conn, addr)     # Đối số truyền cho hàm đó
-                )
-                
-                # [2] Đặt luồng làm daemon để tự thoát khi chương trình chính dừng
-                client_thread.daemon = True
-
-                # [3] Bắt đầu luồng. Vòng lặp chính không chờ mà tiếp tục ngay.
-                client_thread.start()
-            except KeyboardInterrupt:
-                print("\nServer is shutting down.")
-                break
-            except Exception as e:
-                print(f"ERROR: Main loop error: {e}")
+    print(f"Scan engine: {get_engine().name}")
+    server = AgentServer()
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("\nServer is shutting down.")
+    finally:
+        server.executor.shutdown(wait=False)
+        server.io_executor.shutdown(wait=False)
+        server.cache.writer.shutdown(wait=True)  # Ghi nốt các verdict còn trong hàng đợi
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,9 @@
 # ftp_client.py
 import os
 import socket
+import asyncio
 import fnmatch
+import posixpath
 # import glob
 import re
 import configparser
@@ -9,8 +11,34 @@ import sys
 import time       # Ensure time is imported
 import threading  # The key module for this solution
 import logging
-
-BUFFER_SIZE = 4096 # 4KB
+import hashlib
+import sqlite3
+import queue
+import calendar
+import zlib
+import mmap
+import codecs
+from collections import OrderedDict
+
+BUFFER_SIZE = 64 * 1024        # Default bytes read/sent per call on data connections (chunk_size_kb in config.ini)
+MAX_CHUNK_SIZE = 1024 * 1024   # Largest chunk the adaptive mode may grow to (max_chunk_size_kb)
+ADAPT_INTERVAL = 0.2           # Seconds between chunk size adjustments in adaptive mode
+ADAPT_TARGET = 0.01            # Adaptive mode sizes a chunk to about this many seconds of throughput
+PROGRESS_INTERVAL = 0.1        # Seconds between progress bar redraws
+PROGRESS_BAR_LENGTH = 50       # Width of the progress bar in characters
+CLAMAV_BUSY_RETRIES = 3 # Số lần thử lại khi ClamAV agent trả lời BUSY
+AGENT_VERSION_TTL = 60  # Seconds to reuse the agent's signature version before asking again
+REPLY_TIMEOUT = 30      # Seconds to wait for a reply on the control connection
+ACCEPT_TIMEOUT = 10     # Active mode: seconds to wait for the server to connect to our data port
+# Preliminary replies before a data transfer: 150 (opening data connection) or 125 (already open)
+TRANSFER_STARTING = ('150', '125')
+# Final replies of a successful transfer: 226 (closing data connection) or 250
+TRANSFER_COMPLETE = ('226', '250')
+PIPELINE_BATCH = 64     # Max commands written at once by _send_pipelined (keeps replies from piling up)
+RESUME_MIN_SIZE = 1024 * 1024  # Transfers from this size on are journaled so they can be resumed
+MMAP_MIN_SIZE = 8 * 1024 * 1024  # With mmap_downloads, binary downloads from this size on are received into an mmap
+SEGMENTS = 4                   # Parallel sessions used by get for one large file (1 = single stream)
+SEGMENT_THRESHOLD = 64 * 1024 * 1024  # Files smaller than this are always downloaded in a single stream
 
 # --- Setup for Debug Logging to a File (place this at the top of your file, once) ---
 # Create a logger specific for debug messages
@@ -35,14 +63,1111 @@ if not debug_logger.handlers:
 debug_logger.propagate = False
 # --- End of Setup ---
 
+def file_sha256(filepath):
+    """Returns the SHA-256 hex digest of a local file."""
+    return file_digest(filepath, 'sha256')
+
+def file_digest(filepath, algorithm):
+    """Returns the hex digest of a local file.
+
+    Args:
+        filepath (str): The local file.
+        algorithm (str): A hashlib name such as 'sha256' or 'md5', or 'crc32'.
+    """
+    if algorithm == 'crc32':
+        crc = 0
+        with open(filepath, 'rb') as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+        return f"{crc:08x}"
+    digest = hashlib.new(algorithm)
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ChunkSizer:
+    """Chooses how many bytes a transfer loop reads or sends per call.
+
+    In adaptive mode the size is re-evaluated every ADAPT_INTERVAL seconds
+    from the observed throughput, so that one chunk carries roughly
+    ADAPT_TARGET seconds of data: small chunks on slow links, up to
+    `maximum` on fast ones. The configured size is the lower bound.
+    """
+
+    def __init__(self, size=BUFFER_SIZE, maximum=MAX_CHUNK_SIZE, adaptive=False):
+        self.minimum = size
+        self.maximum = max(size, maximum)
+        self.size = size
+        self.adaptive = adaptive
+        self.window_bytes = 0
+        self.window_start = time.monotonic()
+
+    def new_buffer(self):
+        """Returns a reusable receive buffer (memoryview) large enough for any chunk size."""
+        return memoryview(bytearray(self.maximum))
+
+    def record(self, nbytes):
+        """Accounts for nbytes transferred, adjusting size in adaptive mode."""
+        if not self.adaptive:
+            return
+        self.window_bytes += nbytes
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed < ADAPT_INTERVAL:
+            return
+        target = self.window_bytes / elapsed * ADAPT_TARGET
+        size = self.minimum
+        while size < target and size < self.maximum:
+            size *= 2
+        self.size = min(size, self.maximum)
+        self.window_bytes = 0
+        self.window_start = now
+
+
+class AsciiCodec:
+    """Streaming line-ending conversion for TYPE A (ASCII) transfers.
+
+    "decode" turns the CRLF line endings of the FTP data stream into local
+    LF (downloads); "encode" turns LF into CRLF (uploads) without doubling
+    lines that already end in CRLF. A CR at the end of a chunk is held back
+    until the next chunk shows whether it starts a CRLF pair, so pairs split
+    across chunks are converted like any other. Each chunk is converted with
+    bytes.replace(), so large chunks cost no per-byte Python work.
+
+    Usage:
+        codec = AsciiCodec('decode')
+        for chunk in chunks:
+            f.write(codec.convert(chunk))
+        f.write(codec.flush())
+    """
+
+    def __init__(self, direction):
+        """
+        Args:
+            direction (str): 'decode' (CRLF -> LF) or 'encode' (LF -> CRLF).
+        """
+        if direction not in ('decode', 'encode'):
+            raise ValueError(f"Unknown ASCII conversion direction: {direction}")
+        self.direction = direction
+        self.pending_cr = False  # Chunk trước kết thúc bằng CR, chưa biết có phải CRLF không
+
+    def convert(self, data):
+        """Converts one chunk (bytes, bytearray or memoryview) and returns the converted bytes."""
+        chunk = bytearray(b'\r' if self.pending_cr else b'')
+        chunk += data
+        self.pending_cr = chunk.endswith(b'\r')
+        if self.pending_cr:
+            del chunk[-1]
+        if self.direction == 'decode':
+            return chunk.replace(b'\r\n', b'\n')
+        # CRLF có sẵn được giữ nguyên: chuẩn hóa về LF trước rồi mới đổi LF thành CRLF
+        return chunk.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+
+    def flush(self):
+        """Returns what is still held back after the last chunk (a trailing CR)."""
+        tail = b'\r' if self.pending_cr else b''
+        self.pending_cr = False
+        return tail
+
+
+class TransferProgress:
+    """Progress bar of one transfer, redrawn by its own thread.
+
+    The transfer loop only calls update(nbytes), which adds to a counter; a
+    daemon thread redraws the bar every PROGRESS_INTERVAL seconds, so the
+    loop never sleeps or writes to the terminal. When disabled (quiet
+    transfers, `progress = no`, or stdout is not a terminal) no thread is
+    started and nothing is printed.
+
+    Usage:
+        with TransferProgress("Downloading 'a.bin'", total) as progress:
+            ...
+            progress.update(len(chunk))
+    """
+
+    def __init__(self, label, total=None, enabled=True, start=0):
+        """
+        Args:
+            label (str): Text shown before the bar.
+            total (int|None): Expected bytes; None shows only bytes and rate.
+            enabled (bool): If False, the progress bar is not shown.
+            start (int): Bytes already transferred (resumed transfers).
+        """
+        self.label = label
+        self.total = total
+        self.done = start
+        self.start = start
+        self.enabled = enabled and sys.stdout.isatty()
+        self.lock = threading.Lock()  # update() may be called from several threads (segmented get)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started_at = time.monotonic()
+
+    def __enter__(self):
+        if self.enabled:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self._render()
+            sys.stdout.write('\n')
+            sys.stdout.flush()
+        return False
+
+    def update(self, nbytes):
+        """Accounts for nbytes transferred. Never blocks on the terminal."""
+        with self.lock:
+            self.done += nbytes
+
+    def _run(self):
+        """Redraws the bar every PROGRESS_INTERVAL until the transfer ends."""
+        while not self.stop_event.wait(PROGRESS_INTERVAL):
+            self._render()
+
+    @staticmethod
+    def _format_bytes(nbytes):
+        """Formats a byte count as B, KB, MB or GB."""
+        for unit in ('B', 'KB', 'MB'):
+            if nbytes < 1024:
+                return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+            nbytes /= 1024
+        return f"{nbytes:.1f} GB"
+
+    def _render(self):
+        """Writes the current state of the bar over the previous one."""
+        done = self.done
+        elapsed = time.monotonic() - self.started_at
+        rate = (done - self.start) / elapsed if elapsed > 0 else 0
+        speed = f"{self._format_bytes(rate)}/s"
+        if self.total:
+            fraction = min(done / self.total, 1.0)
+            filled_length = int(PROGRESS_BAR_LENGTH * fraction)
+            bar = '█' * filled_length + '-' * (PROGRESS_BAR_LENGTH - filled_length)
+            line = f"\r{self.label} |{bar}| {fraction * 100:.2f}% {speed}   "
+        else:
+            line = f"\r{self.label} {self._format_bytes(done)} {speed}   "
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+class LocalScanCache:
+    """Persistent local cache of scan verdicts, stored in SQLite next to config.ini.
+
+    A verdict is reused when the file's path, size and mtime are unchanged,
+    or when another file with the same SHA-256 was already scanned, and only
+    while the agent still reports the same signature version.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # check_same_thread=False + lock: cache được dùng chung bởi nhiều luồng upload
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                sha256 TEXT,
+                version TEXT,
+                verdict TEXT,
+                scanned_at REAL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS verdicts_sha256 ON verdicts (sha256, version)")
+        self.db.commit()
+        self.version = None  # Last signature version stored
+
+    def lookup(self, path, size, mtime_ns, version):
+        """Returns (verdict, sha256) for an unchanged file, or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT verdict, sha256 FROM verdicts WHERE path = ? AND size = ? AND mtime_ns = ? AND version = ?",
+                (path, size, mtime_ns, version)).fetchone()
+        return row
+
+    def lookup_hash(self, sha256, version):
+        """Returns the verdict of any file with this content hash, or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT verdict FROM verdicts WHERE sha256 = ? AND version = ? LIMIT 1",
+                (sha256, version)).fetchone()
+        return row[0] if row else None
+
+    def store(self, path, size, mtime_ns, sha256, version, verdict):
+        """Records a definitive verdict (OK or INFECTED) for a file."""
+        if verdict not in ("OK", "INFECTED"):
+            return
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, sha256, version, verdict, time.time()))
+            if version != self.version:
+                # Verdict của signature cũ không còn dùng được nữa
+                self.db.execute("DELETE FROM verdicts WHERE version != ?", (version,))
+                self.version = version
+            self.db.commit()
+
+class TransferJournal:
+    """Persistent record of completed and interrupted transfers, stored in SQLite next to config.ini.
+
+    sync uses the completed uploads to recognise files that were already
+    uploaded unchanged, even when the server cannot report modification
+    times. Large transfers in progress are recorded as partials, so get and
+    put (and therefore mget/mput) can resume them after an interruption.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                server TEXT,
+                remote_path TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                sha256 TEXT,
+                uploaded_at REAL,
+                PRIMARY KEY (server, remote_path)
+            )""")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS partials (
+                server TEXT,
+                direction TEXT,
+                remote_path TEXT,
+                local_path TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                started_at REAL,
+                PRIMARY KEY (server, direction, remote_path, local_path)
+            )""")
+        # Các đoạn byte đã tải xong của một segmented download (xem RawFTPClient._segmented_get)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS ranges (
+                server TEXT,
+                remote_path TEXT,
+                local_path TEXT,
+                size INTEGER,
+                start INTEGER,
+                end_offset INTEGER,
+                PRIMARY KEY (server, remote_path, local_path, start)
+            )""")
+        self.db.commit()
+
+    def lookup_upload(self, server, remote_path):
+        """Returns (size, mtime_ns, sha256) of the last upload to remote_path, or None."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT size, mtime_ns, sha256 FROM uploads WHERE server = ? AND remote_path = ?",
+                (server, remote_path)).fetchone()
+
+    def record_upload(self, server, remote_path, size, mtime_ns, sha256):
+        """Records a completed upload of a local file version to remote_path."""
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+                (server, remote_path, size, mtime_ns, sha256, time.time()))
+            self.db.commit()
+
+    def start_partial(self, server, direction, remote_path, local_path, size=None, mtime_ns=None):
+        """Records a transfer in progress ('get' or 'put'), with the local file's size/mtime for uploads."""
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO partials VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (server, direction, remote_path, local_path, size, mtime_ns, time.time()))
+            self.db.commit()
+
+    def lookup_partial(self, server, direction, remote_path, local_path):
+        """Returns (size, mtime_ns) of an unfinished transfer, or None."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT size, mtime_ns FROM partials WHERE server = ? AND direction = ? "
+                "AND remote_path = ? AND local_path = ?",
+                (server, direction, remote_path, local_path)).fetchone()
+
+    def finish_partial(self, server, direction, remote_path, local_path):
+        """Forgets a transfer that has completed (and the ranges of a segmented download)."""
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM partials WHERE server = ? AND direction = ? AND remote_path = ? AND local_path = ?",
+                (server, direction, remote_path, local_path))
+            if direction == 'get':
+                self.db.execute(
+                    "DELETE FROM ranges WHERE server = ? AND remote_path = ? AND local_path = ?",
+                    (server, remote_path, local_path))
+            self.db.commit()
+
+    def record_range(self, server, remote_path, local_path, size, start, end):
+        """Records that bytes [start, end) of a segmented download (of a `size`-byte file) are on disk."""
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO ranges VALUES (?, ?, ?, ?, ?, ?)",
+                (server, remote_path, local_path, size, start, end))
+            self.db.commit()
+
+    def lookup_ranges(self, server, remote_path, local_path, size):
+        """Returns the downloaded ranges [(start, end), ...] of a segmented download, merged and sorted.
+
+        Ranges recorded for a different file size are dropped.
+        """
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM ranges WHERE server = ? AND remote_path = ? AND local_path = ? AND size != ?",
+                (server, remote_path, local_path, size))
+            self.db.commit()
+            rows = self.db.execute(
+                "SELECT start, end_offset FROM ranges WHERE server = ? AND remote_path = ? AND local_path = ? "
+                "ORDER BY start", (server, remote_path, local_path)).fetchall()
+        merged = []
+        for start, end in rows:
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+class FTPReply:
+    """A complete reply read from the FTP control connection (RFC 959).
+
+    Attributes:
+        code (int): The 3-digit reply code, e.g. 230.
+        lines (list[str]): Every line of the reply, including the code prefixes.
+    """
+
+    def __init__(self, code, lines):
+        self.code = code
+        self.lines = lines
+
+    @property
+    def text(self):
+        """The whole reply as one string (lines joined with newlines)."""
+        return '\n'.join(self.lines)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"FTPReply({self.code}, {self.lines!r})"
+
+class RemoteEntry:
+    """One entry of a remote directory listing (from MLSD/MLST or a parsed LIST line).
+
+    Attributes:
+        name (str): Entry name (or the path that was asked for, for MLST).
+        type (str): 'file', 'dir', 'link', or another MLSx type in lower case.
+        size (int|None): Size in bytes, if known.
+        modify (str|None): Last modification time as YYYYMMDDHHMMSS (UTC), MLSx only.
+        unique (str|None): Server-unique id of the file, MLSx only.
+    """
+
+    def __init__(self, name, type='file', size=None, modify=None, unique=None):
+        self.name = name
+        self.type = type
+        self.size = size
+        self.modify = modify
+        self.unique = unique
+
+    @property
+    def is_dir(self):
+        return self.type == 'dir'
+
+    def __repr__(self):
+        return f"RemoteEntry({self.name!r}, {self.type!r}, size={self.size}, modify={self.modify})"
+
+def parse_mlsx_line(line):
+    """Parses one MLSD/MLST fact line (RFC 3659), e.g. "type=file;size=12;modify=20240101120000; a.txt".
+
+    Returns:
+        RemoteEntry|None: The entry, or None if the line is not a fact line.
+    """
+    # Chỉ bỏ khoảng trắng đầu dòng (MLST) và CRLF: tên file có thể kết thúc bằng dấu cách
+    facts, sep, name = line.rstrip('\r\n').lstrip(' ').partition(' ')
+    if not sep or not name:
+        return None
+    values = {}
+    for fact in facts.split(';'):
+        key, eq, value = fact.partition('=')
+        if eq:
+            values[key.lower()] = value
+    size = values.get('size') or values.get('sizd')
+    modify = values.get('modify')
+    return RemoteEntry(
+        name,
+        type=values.get('type', 'file').lower(),
+        size=int(size) if size and size.isdigit() else None,
+        modify=modify[:14] if modify else None,
+        unique=values.get('unique'),
+    )
+
+def parse_mlsx_time(value):
+    """Converts an MLSx time value (YYYYMMDDHHMMSS, UTC) to a Unix timestamp, or None."""
+    if not value:
+        return None
+    try:
+        return calendar.timegm(time.strptime(value[:14], "%Y%m%d%H%M%S"))
+    except ValueError:
+        return None
+
+# DOS/IIS LIST line: "01-01-24  12:00PM       <DIR>          name" or "... 1234 name"
+DOS_LIST_LINE = re.compile(r'^\d{2}-\d{2}-\d{2,4}\s+\d{1,2}:\d{2}\s*(?:[AP]M)?\s+(<DIR>|\d+)\s+(.+)$', re.IGNORECASE)
+
+def parse_list_line(line):
+    """Parses one line of a LIST reply.
+
+    Unix-style lines ("-rw-r--r-- 1 ftp ftp 12 Jan 01 12:00 a b.txt") and
+    DOS/IIS-style lines ("01-01-24  12:00PM  <DIR>  a b") are understood.
+
+    Returns:
+        RemoteEntry|None: The entry (without modify/unique), or None for lines like "total 8".
+    """
+    match = DOS_LIST_LINE.match(line.rstrip('\r\n'))
+    if match:
+        size_or_dir, name = match.groups()
+        if size_or_dir.upper() == '<DIR>':
+            return RemoteEntry(name, type='dir')
+        return RemoteEntry(name, type='file', size=int(size_or_dir))
+    parts = line.split(None, 8)
+    if len(parts) < 9:
+        return None
+    name = parts[8]
+    type_char = parts[0][0]
+    if type_char == 'd':
+        entry_type = 'dir'
+    elif type_char == 'l':
+        entry_type = 'link'
+        name = name.split(' -> ', 1)[0]
+    else:
+        entry_type = 'file'
+    return RemoteEntry(name, type=entry_type, size=int(parts[4]) if parts[4].isdigit() else None)
+
+def split_ranges(done, size, segments):
+    """Splits the bytes of a file that are not downloaded yet into ranges for parallel sessions.
+
+    Args:
+        done (list[tuple]): Sorted, merged (start, end) ranges already on disk.
+        size (int): File size in bytes.
+        segments (int): Number of sessions; the missing bytes are cut into pieces of about missing/segments.
+
+    Returns:
+        tuple: (list of (start, end) ranges, missing byte count, piece length)
+    """
+    gaps = []
+    pos = 0
+    for start, end in done + [(size, size)]:
+        if start > pos:
+            gaps.append((pos, start))
+        pos = max(pos, end)
+    missing = sum(end - start for start, end in gaps)
+    seg_len = max(-(-missing // segments), 1)
+    ranges = [(start, min(start + seg_len, end)) for gap_start, end in gaps
+              for start in range(gap_start, end, seg_len)]
+    return ranges, missing, seg_len
+
+class ListingCache:
+    """Size-bounded LRU cache of remote directory listings with a time-to-live.
+
+    Keys are (command, absolute remote path), values the raw bytes received
+    on the data connection. One cache is shared by a session and the
+    sessions cloned from it, so it is protected by a lock.
+    """
+
+    def __init__(self, max_entries=256, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # (command, path) -> (stored_at, listing)
+        self.lock = threading.Lock()
+
+    def get(self, command, path):
+        """Returns the cached listing, or None if missing or older than ttl seconds."""
+        key = (command, path)
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return item[1]
+
+    def put(self, command, path, listing):
+        """Stores a listing, evicting the least recently used ones beyond max_entries."""
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[(command, path)] = (time.monotonic(), listing)
+            self.entries.move_to_end((command, path))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, path, tree=False):
+        """Drops the listings of a directory (and, with tree=True, of everything below it)."""
+        prefix = path.rstrip('/') + '/'
+        with self.lock:
+            for key in list(self.entries):
+                if key[1] == path or (tree and key[1].startswith(prefix)):
+                    del self.entries[key]
+
+class FTPSessionPool:
+    """A pool of extra logged-in FTP sessions cloned from a main client.
+
+    Sessions are opened lazily (at most `size`), start in the same remote
+    directory as the main session and are used by one thread at a time.
+    Use it as a context manager so every session is closed afterwards.
+    """
+
+    def __init__(self, client, size):
+        self.client = client
+        self.size = size
+        # Lấy thư mục hiện tại một lần ở luồng chính, các luồng worker không dùng control socket chính
+        self.cwd = client.remote_cwd()
+        self.sessions = []
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.opening = 0
+
+    def acquire(self):
+        """Returns an idle session, opening a new one if the pool is not full yet."""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_open = len(self.sessions) + self.opening < self.size
+            if can_open:
+                self.opening += 1
+        if not can_open:
+            return self.idle.get()
+        try:
+            session = self.client.clone_session(self.cwd)
+        finally:
+            with self.lock:
+                self.opening -= 1
+        with self.lock:
+            self.sessions.append(session)
+        return session
+
+    def release(self, session):
+        """Returns a session to the pool."""
+        self.idle.put(session)
+
+    def close(self):
+        """Disconnects every session opened by the pool."""
+        for session in self.sessions:
+            try:
+                session.disconnect(quiet=True)
+            except Exception:
+                pass
+        self.sessions = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ParallelDownloader:
+    """Downloads queued remote files over a pool of parallel FTP sessions.
+
+    The caller keeps crawling the remote tree on its own session and calls
+    submit() for each file; worker threads download them meanwhile. Progress
+    (files and bytes) is aggregated over all workers.
+    """
+
+    def __init__(self, client, jobs):
+        self.client = client
+        self.pool = FTPSessionPool(client, jobs)
+        self.work = queue.Queue()
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.done = 0
+        self.failed = 0
+        self.bytes_done = 0
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(jobs)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, remote_path, local_path, mtime=None, size=None):
+        """Queues one remote file for download (mtime: see RawFTPClient.get).
+
+        size is accepted so submit can stand in for RawFTPClient.get; the
+        workers never split a file into segments.
+        """
+        with self.lock:
+            self.queued += 1
+        self.work.put((remote_path, local_path, mtime))
+
+    def _worker(self):
+        try:
+            session = self.pool.acquire()
+        except Exception as e:
+            sys.stdout.write(f"[ERROR] Could not open a parallel session: {e}\n")
+            return
+        try:
+            while True:
+                item = self.work.get()
+                if item is None:
+                    return
+                remote_path, local_path, mtime = item
+                ok = session.get(remote_path, local_path, quiet=True, mtime=mtime, segments=1)
+                size = os.path.getsize(local_path) if ok and os.path.isfile(local_path) else 0
+                with self.lock:
+                    if ok:
+                        self.done += 1
+                        self.bytes_done += size
+                    else:
+                        self.failed += 1
+                    line = (f"[mget] {self.done}/{self.queued} files, "
+                            f"{self.bytes_done / (1024 * 1024):.1f} MB downloaded")
+                sys.stdout.write(line + (f" ({self.failed} failed)" if self.failed else "") + "\n")
+        finally:
+            self.pool.release(session)
+
+    def finish(self):
+        """Waits for every queued file, then closes the sessions.
+
+        Files left over because no session could be opened are downloaded
+        with the main session.
+        """
+        for _ in self.threads:
+            self.work.put(None)
+        for t in self.threads:
+            t.join()
+        self.pool.close()
+        while not self.work.empty():
+            item = self.work.get_nowait()
+            if item is not None:
+                remote_path, local_path, mtime = item
+                self.client.get(remote_path, local_path, mtime=mtime)
+        print(f"[mget] Finished: {self.done} files, {self.bytes_done / (1024 * 1024):.1f} MB"
+              + (f", {self.failed} failed" if self.failed else ""))
+
+class EventLoopThread:
+    """An asyncio event loop running in a daemon thread.
+
+    Lets synchronous code (the interactive shell, RawFTPClient, worker
+    threads of FTPSessionPool) call the coroutines of AsyncFTPClient: run()
+    submits a coroutine to the loop and blocks until it finishes. All
+    sessions of the process share one loop (see shared()), so the control
+    connections and transfers of every session are multiplexed on it.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ftp-event-loop", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def shared(cls):
+        """Returns the process-wide loop thread, starting it on first use."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def call(self, func, *args):
+        """Schedules a plain call on the loop without waiting for it (runs in order with run())."""
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def run(self, coro):
+        """Runs a coroutine on the loop and returns its result (or raises its exception)."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result()
+        except BaseException:
+            # Ví dụ Ctrl+C trong lúc chờ: hủy luôn coroutine đang chạy trên loop
+            future.cancel()
+            raise
+
+
+class AsyncFTPClient:
+    """asyncio implementation of the FTP control and data connections.
+
+    Every method that talks to the server is a coroutine, so one event loop
+    drives the control connections and the transfers of many sessions at
+    once. Replies are read with reply_timeout applied by asyncio.wait_for.
+
+    Data connections are plain non-blocking sockets driven with the loop's
+    sock_* calls, so the transfer primitives keep the zero-copy paths:
+
+        sock, offset = await core.start_transfer("RETR a.bin", offset)
+        await core.receive(sock, sink, sizer)          # recv_into a reused buffer
+        await core.receive_into(sock, view, sizer)     # recv_into e.g. an mmap
+        await core.send_file(sock, f, offset, sizer)   # sendfile(2)
+        reply = await core.end_transfer(sock)
+
+    RawFTPClient (and so the interactive shell) is a synchronous wrapper
+    over this class on an EventLoopThread. It keeps what lies around the
+    transfer (resume journal, segments, local files), and passes its
+    buffers, sinks and progress bars into these coroutines.
+    """
+    # Settings RawFTPClient copies into its core before every call
+    SETTINGS = ('passive_mode', 'local_test_mode', 'reply_timeout', 'socket_buffer')
+
+    def __init__(self):
+        self.reader = None            # StreamReader of the control connection
+        self.writer = None            # StreamWriter of the control connection
+        self.host = None
+        self.port = 21
+        self.reply_timeout = REPLY_TIMEOUT
+        self.passive_mode = True
+        self.local_test_mode = False  # Active mode: send 127.0.0.1 in PORT
+        self.socket_buffer = 0        # SO_RCVBUF/SO_SNDBUF of data sockets (0 = OS default)
+
+    async def open(self, host, port=21):
+        """Opens the control connection and returns the server's welcome reply."""
+        self.host = host
+        self.port = port
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), self.reply_timeout)
+        return await self.read_reply()
+
+    async def close(self):
+        """Closes the control connection without sending QUIT."""
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    async def send_cmd(self, cmd):
+        """Sends one command (CRLF is appended).
+
+        Raises:
+            ConnectionError: If the control connection is not open.
+        """
+        if self.writer is None:
+            raise ConnectionError("Not connected to an FTP server")
+        self.writer.write((cmd + '\r\n').encode())
+        await self.writer.drain()
+
+    async def send_pipelined(self, commands):
+        """Sends commands in batches of PIPELINE_BATCH and returns their replies in order.
+
+        Only use it for commands that produce exactly one reply (no data transfers).
+        """
+        replies = []
+        for start in range(0, len(commands), PIPELINE_BATCH):
+            batch = commands[start:start + PIPELINE_BATCH]
+            if self.writer is None:
+                raise ConnectionError("Not connected to an FTP server")
+            self.writer.write(''.join(cmd + '\r\n' for cmd in batch).encode())
+            await self.writer.drain()
+            for _ in batch:
+                replies.append(await self.read_reply())
+        return replies
+
+    async def _read_line(self):
+        """Reads one line (without CRLF) from the control connection."""
+        line = await self.reader.readline()
+        if not line.endswith(b'\n'):
+            raise ConnectionError("Control connection closed by server")
+        return line[:-1].rstrip(b'\r').decode(errors='replace')
+
+    async def _read_reply(self):
+        first = await self._read_line()
+        lines = [first]
+        code = first[:3]
+        if len(first) >= 4 and first[3] == '-':
+            while True:
+                line = await self._read_line()
+                lines.append(line)
+                if line[:3] == code and line[3:4] == ' ':
+                    break
+        try:
+            return FTPReply(int(code), lines)
+        except ValueError:
+            return FTPReply(0, lines)
+
+    async def read_reply(self):
+        """Reads one complete reply, including multi-line replies.
+
+        Returns:
+            FTPReply: The parsed reply.
+
+        Raises:
+            socket.timeout: If the reply does not arrive within reply_timeout.
+            ConnectionError: If the server closed the control connection.
+        """
+        try:
+            return await asyncio.wait_for(self._read_reply(), self.reply_timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout("Timeout receiving response") from None
+
+    async def command(self, cmd):
+        """Sends a command and returns its reply."""
+        await self.send_cmd(cmd)
+        return await self.read_reply()
+
+    # --- Data connection ---
+
+    def _data_socket(self):
+        """Returns a new non-blocking TCP socket with socket_buffer applied (before connect/listen)."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.socket_buffer > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.socket_buffer)
+        sock.setblocking(False)
+        return sock
+
+    async def _connect_data(self, host, port):
+        sock = self._data_socket()
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (host, port)),
+                                   self.reply_timeout)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    async def open_data_connection(self):
+        """Prepares a data connection: EPSV (falling back to PASV) or PORT.
+
+        Returns:
+            socket.socket: Connected socket in passive mode, or the listening
+            socket in active mode (accepted after the transfer command).
+
+        Raises:
+            Exception: If neither EPSV nor PASV succeeds, or if PORT fails.
+        """
+        if self.passive_mode:
+            reply = await self.command("EPSV")
+            # "229 Entering Extended Passive Mode (|||64311|)": cùng host với kết nối điều khiển
+            match = re.search(r'\(\|\|\|(\d+)\|\)', reply.text) if reply.code == 229 else None
+            if match:
+                return await self._connect_data(self.host, int(match.group(1)))
+            debug_logger.debug(f"EPSV failed ({reply}), trying PASV")
+            reply = await self.command("PASV")
+            if reply.code != 227:
+                raise Exception(f"PASV failed: {reply}")
+            match = re.search(r'\((.*?)\)', reply.text)
+            numbers = match.group(1).split(',') if match else []
+            if len(numbers) != 6:
+                raise Exception("Invalid PASV address data")
+            ip = '.'.join(numbers[:4])
+            port = (int(numbers[4]) << 8) + int(numbers[5])
+            return await self._connect_data(ip, port)
+
+        # Active mode: lắng nghe một cổng ngẫu nhiên và báo cho server bằng PORT.
+        # IP gửi đi là IP local của kết nối điều khiển: đúng interface mà server nhìn thấy
+        ip = "127.0.0.1" if self.local_test_mode else self.writer.get_extra_info('sockname')[0]
+        listener = self._data_socket()
+        try:
+            listener.bind(('', 0))
+            listener.listen(1)
+            port = listener.getsockname()[1]
+            # Server tính lại port từ p1 và p2: port = (p1 * 256) + p2
+            reply = await self.command(f"PORT {ip.replace('.', ',')},{port >> 8},{port & 0xFF}")
+            if reply.code != 200:
+                raise Exception(f"PORT failed: {reply}")
+        except BaseException:
+            listener.close()
+            raise
+        return listener
+
+    async def start_transfer(self, command, offset=0):
+        """Opens a data connection, sends REST (if offset) and the transfer command.
+
+        If the server refuses REST, a STOR becomes APPE (append at the end
+        of the remote file, which is `offset` bytes long) and any other
+        command starts from 0.
+
+        Args:
+            command (str): The full command, e.g. "RETR a.bin" or "MLSD dir".
+            offset (int): Byte to start from.
+
+        Returns:
+            tuple: (socket.socket, int) the connected data socket and the offset actually used.
+
+        Raises:
+            Exception: If the transfer command is refused (the server's reply).
+            socket.timeout: If the server does not connect in active mode.
+        """
+        sock = await self.open_data_connection()
+        try:
+            if offset:
+                reply = await self.command(f"REST {offset}")
+                if reply.code != 350:
+                    debug_logger.debug(f"REST {offset} refused: {reply}")
+                    if command.startswith("STOR "):
+                        command = "APPE " + command[5:]
+                    else:
+                        offset = 0
+            reply = await self.command(command)
+            if not reply.text.startswith(TRANSFER_STARTING):
+                raise Exception(reply.text)
+            if not self.passive_mode:
+                listener = sock
+                try:
+                    sock, _ = await asyncio.wait_for(asyncio.get_running_loop().sock_accept(listener),
+                                                     ACCEPT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raise socket.timeout("Timeout waiting for server to connect in active mode.") from None
+                finally:
+                    listener.close()
+                sock.setblocking(False)
+        except BaseException:
+            sock.close()
+            raise
+        return sock, offset
+
+    async def receive(self, sock, sink, sizer, limit=None, progress=None):
+        """Receives into one reused buffer until EOF (or `limit` bytes) and hands every chunk to `sink`.
+
+        Args:
+            sock (socket.socket): Data socket from start_transfer().
+            sink (callable): Called with a memoryview of each chunk; it is only valid during the call.
+            sizer (ChunkSizer): Chunk size for each recv_into().
+            limit (int|None): Stop after this many bytes.
+            progress (TransferProgress|None): Updated with every chunk.
+
+        Returns:
+            int: Bytes received.
+        """
+        loop = asyncio.get_running_loop()
+        buf = sizer.new_buffer()
+        received = 0
+        while limit is None or received < limit:
+            size = sizer.size if limit is None else min(sizer.size, limit - received)
+            n = await loop.sock_recv_into(sock, buf[:size])
+            if not n:
+                break
+            sink(buf[:n])
+            received += n
+            sizer.record(n)
+            if progress:
+                progress.update(n)
+        return received
+
+    async def receive_into(self, sock, view, sizer, progress=None):
+        """Receives straight into `view` (e.g. a memoryview of an mmap) until it is full or EOF.
+
+        A broken data connection ends the receive like EOF does, so the
+        caller always learns how many bytes landed in `view`; the final
+        reply of the transfer tells what went wrong.
+
+        Returns:
+            int: Bytes received.
+        """
+        loop = asyncio.get_running_loop()
+        received = 0
+        while received < len(view):
+            chunk = view[received:received + sizer.size]
+            try:
+                n = await loop.sock_recv_into(sock, chunk)
+            except OSError as e:
+                debug_logger.debug(f"Data connection broke after {received} bytes: {e}")
+                break
+            finally:
+                # Không giữ lại tham chiếu tới vùng nhớ (mmap chỉ đóng được khi không còn view nào)
+                chunk.release()
+            if not n:
+                break
+            received += n
+            sizer.record(n)
+            if progress:
+                progress.update(n)
+        return received
+
+    async def send_file(self, sock, f, offset, sizer, progress=None, ascii=False):
+        """Sends a local file from `offset` on the data connection.
+
+        Binary files go through loop.sock_sendfile(), i.e. sendfile(2) where
+        the platform has it; with a progress bar they are sent in chunks of
+        sizer.size so the bar can move. ASCII files are converted with
+        AsciiCodec on the way.
+
+        Returns:
+            int: Bytes read from the file.
+        """
+        loop = asyncio.get_running_loop()
+        sent_total = 0
+        if not ascii:
+            if progress is None:
+                # count=None: cả file trong một lần gọi, kernel copy thẳng từ file ra socket
+                return await loop.sock_sendfile(sock, f, offset)
+            while True:
+                sent = await loop.sock_sendfile(sock, f, offset + sent_total, sizer.size)
+                if not sent:
+                    break
+                sent_total += sent
+                sizer.record(sent)
+                progress.update(sent)
+            return sent_total
+        codec = AsciiCodec('encode')
+        f.seek(offset)
+        while True:
+            data = f.read(sizer.size)
+            if not data:
+                break
+            # ASCII: \n thành \r\n, dòng đã có \r\n giữ nguyên (kể cả khi bị cắt giữa hai lần đọc)
+            await loop.sock_sendall(sock, codec.convert(data))
+            sent_total += len(data)
+            sizer.record(len(data))
+            if progress:
+                progress.update(len(data))
+        await loop.sock_sendall(sock, codec.flush())
+        return sent_total
+
+    async def end_transfer(self, sock):
+        """Closes the data connection and returns the final reply of the transfer."""
+        sock.close()
+        return await self.read_reply()
+
+    async def list(self, command, callback=None, sizer=None):
+        """Runs a listing command (LIST, NLST or MLSD, with its path) and returns its output.
+
+        Args:
+            command (str): The full command, e.g. "MLSD dir".
+            callback (callable|None): Called with every chunk as it arrives (e.g. to print it).
+            sizer (ChunkSizer|None): Chunk sizes to read with.
+
+        Returns:
+            tuple: (bytes listing, FTPReply final reply)
+        """
+        sock, _ = await self.start_transfer(command)
+        listing = bytearray()
+
+        def sink(chunk):
+            listing.extend(chunk)
+            if callback:
+                callback(chunk)
+
+        try:
+            await self.receive(sock, sink, sizer or ChunkSizer())
+        except BaseException:
+            sock.close()
+            raise
+        return bytes(listing), await self.end_transfer(sock)
+
+
 class RawFTPClient:
     def __init__(self):
         """Initializes the FTP client instance with default settings.
 
+        The control connection and all data transfers run on an AsyncFTPClient
+        (`core`) driven through the shared EventLoopThread; this class keeps a
+        blocking API for the interactive shell and the worker threads.
+
         Attributes:
-            control_sock (socket.socket|None): The control connection socket to the FTP server.
+            core (AsyncFTPClient|None): asyncio core holding the control connection to the FTP server.
+            reply_timeout (int): Seconds to wait for a reply on the control connection.
             passive_mode (bool): True if passive mode is enabled, False for active mode.
-            active_data_listener (socket.socket|None): Listening socket for active mode.
             local_test_mode (bool): If True, active mode will bind to 127.0.0.1 for local testing.
             transfer_mode (str): File transfer type, either 'binary' or 'ascii'.
             prompt (bool): If True, prompt user before each transfer in mget/mput.
@@ -50,17 +1175,27 @@ class RawFTPClient:
             host (str|None): The connected FTP server's hostname or IP.
             clamav_host (str|None): Host for ClamAV scanning agent.
             clamav_port (int|None): Port for ClamAV scanning agent.
+            clamav_hash_probe (bool): If True, ask the agent for a cached verdict by SHA-256 first.
+            scan_cache (LocalScanCache|None): Local cache of scan verdicts.
+            journal (TransferJournal|None): Local record of completed uploads, used by sync.
+            pipeline_depth (int): Number of files mput may scan ahead of the uploads.
+            segments (int): Sessions get uses for one file of at least segment_threshold bytes.
+            chunk_size (int): Bytes read/sent per call on data connections (minimum in adaptive mode).
+            max_chunk_size (int): Upper bound for the chunk size in adaptive mode.
+            adaptive_chunks (bool): If True, the chunk size grows with the observed throughput.
+            socket_buffer (int): SO_RCVBUF/SO_SNDBUF for data sockets in bytes (0 = OS default).
+            mmap_downloads (bool): If True, large binary downloads are received straight into an mmap of the file.
+            show_progress (bool): If True, get, put and scans show a progress bar (see TransferProgress).
         """
         # --- FTP Control Connection Attributes ---
-        self.control_sock = None  # Socket object for the main control connection (commands & responses)
+        self.core = None          # AsyncFTPClient owning the control connection (commands & responses)
                                   # It will be set when connected to an FTP server.
+        self.reply_timeout = REPLY_TIMEOUT  # Seconds to wait for a reply from the server.
         
         # --- FTP Transfer Attributes ---
         self.passive_mode = True  # Boolean flag: True for Passive Mode (client connects to server's data port),
                                   # False for Active Mode (server connects to client's data port).
                                   # Passive mode is generally preferred due to firewall/NAT compatibility.
-        self.active_data_listener = None # Socket object for the data connection listener in Active Mode.
-                                          # This socket waits for the FTP server to connect to the client.
         self.local_test_mode = False  # Boolean flag: If True, forces Active Mode to use 127.0.0.1 (loopback)
                                       # for its IP address in the PORT command. Useful for local testing
                                       # without NAT/firewall issues. Defaults to False (uses real IP).
@@ -74,10 +1209,32 @@ class RawFTPClient:
 
         # --- Connection Details ---
         self.host = None              # String: IP address of the currently connected FTP server.
+        self.port = 21                # Integer: Control port of the connected FTP server.
+        self.user = None              # String: Username of the current login (reused by extra sessions).
+        self._password = None         # String: Password of the current login (reused by extra sessions).
         self.clamav_host = None       # String: IP address of the ClamAV scanning agent.
                                       # Loaded from config.ini.
         self.clamav_port = None       # Integer: The port number of the ClamAV scanning agent.
                                       # Loaded from config.ini.
+        self.clamav_hash_probe = True # Boolean flag: ask the agent for a cached verdict by SHA-256
+                                      # before sending the file. Turned off if the agent is too old.
+        self.scan_cache = None        # LocalScanCache|None: local verdict cache, created by load_config().
+        self.journal = None           # TransferJournal|None: record of completed uploads, created by load_config().
+        self.scan_digests = {}        # abs path -> (size, mtime_ns, sha256) from scan_with_clamav, used by _store_file.
+        self.pipeline_depth = 4       # Integer: how many files mput may scan ahead of the upload (0 = no pipelining).
+        self.segments = SEGMENTS      # Integer: byte ranges (and sessions) get uses for one large file.
+        self.segment_threshold = SEGMENT_THRESHOLD  # Integer: smallest file size (bytes) get splits into segments.
+        self.chunk_size = BUFFER_SIZE          # Integer: bytes per recv/send on data connections.
+        self.max_chunk_size = MAX_CHUNK_SIZE   # Integer: largest chunk in adaptive mode.
+        self.adaptive_chunks = True            # Boolean flag: grow the chunk size with throughput.
+        self.socket_buffer = 0                 # Integer: SO_RCVBUF/SO_SNDBUF of data sockets (0 = OS default).
+        self.mmap_downloads = False            # Boolean flag: receive large binary downloads into an mmap.
+        self.show_progress = True              # Boolean flag: progress bars for get/put/scan (off = batch mode).
+        self.agent_version = None     # (version, checked_at) of the agent's signature database.
+        self.remote_dir = None        # String|None: absolute remote directory, resolved lazily with PWD.
+        self.known_dirs = set()       # Set of absolute remote directories known to exist (see make_remote_dirs).
+        self.features = None          # Dict|None: FEAT reply of the server (feature -> parameters), read lazily.
+        self.listing_cache = ListingCache()  # Recent directory listings, used by ls and mget.
 
     # Method to load the configuration
     def load_config(self):
@@ -102,6 +1259,34 @@ class RawFTPClient:
             else:
                 print(f"[INFO] ClamAV agent loaded from config: {self.clamav_host}:{self.clamav_port}")
 
+            self.pipeline_depth = config['DEFAULT'].getint('pipeline_depth', self.pipeline_depth)
+            self.reply_timeout = config['DEFAULT'].getint('reply_timeout', self.reply_timeout)
+            self.segments = config['DEFAULT'].getint('segments', self.segments)
+            chunk_kb = config['DEFAULT'].getint('chunk_size_kb', self.chunk_size // 1024)
+            max_chunk_kb = config['DEFAULT'].getint('max_chunk_size_kb', self.max_chunk_size // 1024)
+            socket_kb = config['DEFAULT'].getint('socket_buffer_kb', self.socket_buffer // 1024)
+            # Chunk 0 KB làm vòng lặp nhận/gửi không bao giờ tiến lên, giống điều kiện của lệnh buffer
+            if chunk_kb <= 0 or max_chunk_kb <= 0 or socket_kb < 0:
+                print("[WARN] chunk_size_kb and max_chunk_size_kb must be positive and socket_buffer_kb "
+                      "not negative in config.ini. Using the default buffer sizes.")
+            else:
+                self.chunk_size = chunk_kb * 1024
+                self.max_chunk_size = max_chunk_kb * 1024
+                self.socket_buffer = socket_kb * 1024
+            self.adaptive_chunks = config['DEFAULT'].getboolean('adaptive_chunks', self.adaptive_chunks)
+            self.mmap_downloads = config['DEFAULT'].getboolean('mmap_downloads', self.mmap_downloads)
+            self.show_progress = config['DEFAULT'].getboolean('progress', self.show_progress)
+            self.segment_threshold = config['DEFAULT'].getint(
+                'segment_threshold_mb', self.segment_threshold // (1024 * 1024)) * 1024 * 1024
+            self.listing_cache.ttl = config['DEFAULT'].getint('listing_cache_ttl', self.listing_cache.ttl)
+            self.listing_cache.max_entries = config['DEFAULT'].getint('listing_cache_size', self.listing_cache.max_entries)
+
+            # Cache kết quả quét cục bộ, đặt cạnh config.ini
+            if config['DEFAULT'].getboolean('local_scan_cache', True):
+                self.scan_cache = LocalScanCache(os.path.join(script_dir, 'scan_cache.sqlite3'))
+            if config['DEFAULT'].getboolean('transfer_journal', True):
+                self.journal = TransferJournal(os.path.join(script_dir, 'transfer_journal.sqlite3'))
+
         except FileNotFoundError:
             print("[WARN] config.ini not found. Virus scanning will be disabled.")
             print("[WARN] Please create config.ini to enable scanning.")
@@ -114,18 +1299,22 @@ class RawFTPClient:
         self.clamav_port = port
         print(f"[OK] ClamAV agent address set to {self.clamav_host}:{self.clamav_port}")
 
-    def connect(self, host, port=21):
+    def connect(self, host, port=21, user=None, passwd=None, quiet=False):
         """
         Establishes a connection to the FTP server and handles user authentication.
 
         This method initializes the control connection socket, connects to the
         specified host and port, prompts the user for credentials, and
         attempts to log in. Upon successful login, it sets the client's
-        connection status and changes the working directory to 'ftp' on the server.
+        connection status, sends TYPE for the current transfer_mode and changes
+        the working directory to 'ftp' on the server.
 
         Args:
             host (str): The hostname or IP address of the FTP server.
             port (int, optional): The port number to connect to. Defaults to 21 (standard FTP port).
+            user (str|None): Username. Prompted for if None.
+            passwd (str|None): Password. Prompted for if None.
+            quiet (bool): If True, only errors are printed (sessions opened by clone_session).
 
         Raises:
             Exception: If the login attempt fails (e.g., incorrect credentials or server error).
@@ -133,15 +1322,19 @@ class RawFTPClient:
         """
         # Set FTP server host
         self.host = host
-        # socket.AF_INET: Chỉ định rằng đây là một socket internet sử dụng địa chỉ IPv4.
-        # socket.SOCK_STREAM: Sử dụng TCP, FTP là truyền file cần độ tin cậy
-        self.control_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Thiết lập kết nối TCP đến địa chỉ và cổng của máy chủ FTP
-        self.control_sock.connect((host, port))
-        self._recv_response_blocking()
-
-        user = input("Username: ")
-        passwd = input("Password: ")
+        self.port = port
+        self.core = AsyncFTPClient()
+        self.remote_dir = None
+        self.known_dirs = set()
+        self.features = None
+        self.listing_cache = ListingCache(self.listing_cache.max_entries, self.listing_cache.ttl)
+        # Thiết lập kết nối TCP (asyncio) đến địa chỉ và cổng của máy chủ FTP, đọc lời chào
+        self._run(self.core.open(host, port))
+
+        if user is None:
+            user = input("Username: ")
+        if passwd is None:
+            passwd = input("Password: ")
 
         self._send_cmd(f"USER {user}")
         resp = self._recv_response_blocking()
@@ -153,49 +1346,281 @@ class RawFTPClient:
             raise Exception("Login failed.")
 
         self.connected = True
-        print(f"Connected to {host}:{port} as {user}")
+        # Lưu lại thông tin đăng nhập để mở thêm session song song (FTPSessionPool)
+        self.user = user
+        self._password = passwd
+        if not quiet:
+            print(f"Connected to {host}:{port} as {user}")
+
+        # Luôn gửi TYPE vì chế độ mặc định của server có thể khác (thường là ASCII)
+        type_cmd = "TYPE A" if self.transfer_mode == 'ascii' else "TYPE I"
+        self._send_cmd(type_cmd)
+        resp = self._recv_response_blocking()
+        if not resp.startswith('200'):
+            print(f"[WARN] {type_cmd} failed: {resp}")
 
         if not self.local_test_mode and self.host != '127.0.0.1':
-            self.cd('ftp')
+            self.cd('ftp', quiet)
 
-    def disconnect(self):
+    def disconnect(self, quiet=False):
         """Disconnects from the FTP server.
 
         Sends the QUIT command to the server, closes the control socket, and updates
         connection state. Any errors during QUIT or close are suppressed to prevent
         crashing.
+
+        Args:
+            quiet (bool): If True, nothing is printed (sessions closed by FTPSessionPool).
         """
-        if self.control_sock:
+        if self.core:
             try:
                 self._send_cmd("QUIT")
-                print(self._recv_response_blocking())
+                resp = self._recv_response_blocking()
+                if not quiet:
+                    print(resp)
             except:
                 pass
-            self.control_sock.close()
-            self.control_sock = None
+            try:
+                self._run(self.core.close())
+            except Exception:
+                pass
+            self.core = None
             self.connected = False
-            print("Disconnected from server.")
+            if not quiet:
+                print("Disconnected from server.")
+
+    def clone_session(self, cwd=None):
+        """Opens another logged-in control connection with the same settings.
+
+        Used by FTPSessionPool to run several transfers in parallel. Login
+        and the change of directory are quiet, so they do not interleave with
+        the progress output of the transfers already running.
+
+        Args:
+            cwd (str|None): Absolute remote directory the new session should change to.
+
+        Returns:
+            RawFTPClient: The new, connected session.
+        """
+        session = RawFTPClient()
+        for attr in ('passive_mode', 'local_test_mode', 'clamav_host', 'clamav_port',
+                     'transfer_mode', 'clamav_hash_probe', 'scan_cache', 'journal', 'pipeline_depth', 'reply_timeout',
+                     'segments', 'segment_threshold', 'chunk_size', 'max_chunk_size',
+                     'adaptive_chunks', 'socket_buffer', 'mmap_downloads', 'show_progress'):
+            setattr(session, attr, getattr(self, attr))
+        session.prompt = False
+        session.connect(self.host, self.port, self.user, self._password, quiet=True)
+        # Cùng server, cùng user: các session dùng chung cache thư mục đã biết
+        session.known_dirs = self.known_dirs
+        session.features = self.features
+        session.listing_cache = self.listing_cache
+        if cwd:
+            session.cd(cwd, quiet=True)
+        return session
+
+    def remote_cwd(self):
+        """Returns the absolute current directory on the server (parsed from PWD), or None."""
+        self._send_cmd("PWD")
+        resp = self._recv_response_blocking()
+        # 257 "/home/ftp" is the current directory
+        match = re.match(r'257 "(.*)"', resp)
+        return match.group(1).replace('""', '"') if match else None
+
+    def remote_size(self, path):
+        """Returns the size of a remote file in bytes (SIZE, RFC 3659), or None."""
+        self._send_cmd(f"SIZE {path}")
+        resp = self._recv_response_blocking()
+        fields = resp.split()
+        if resp.startswith("213") and len(fields) >= 2 and fields[1].isdigit():
+            return int(fields[1])
+        return None
+
+    def has_feature(self, name):
+        """Tells whether the server announced a feature in its FEAT reply (RFC 2389).
+
+        FEAT is sent once per connection; servers without FEAT have no features.
+
+        Args:
+            name (str): Feature name, e.g. "MLST" or "REST".
+
+        Returns:
+            bool: True if the feature is supported.
+        """
+        if self.features is None:
+            self.features = {}
+            self._send_cmd("FEAT")
+            try:
+                reply = self._read_reply()
+            except Exception as e:
+                print(f"[ERROR] {str(e)}")
+                return False
+            if reply.code == 211:
+                # 211-Features:
+                #  MLST type*;size*;modify*;
+                #  REST STREAM
+                # 211 End
+                for line in reply.lines[1:-1]:
+                    feature, _, params = line.strip().partition(' ')
+                    if feature:
+                        self.features[feature.upper()] = params
+        return name.upper() in self.features
+
+    def _abs_remote(self, path):
+        """Returns the absolute, normalized form of a remote path.
+
+        Relative paths are resolved against the current remote directory,
+        which is asked for with PWD the first time it is needed after a CWD.
+
+        Args:
+            path (str): Remote path, absolute or relative to the current directory.
+
+        Returns:
+            str: Absolute remote path.
+        """
+        path = path.replace('\\', '/')
+        if not path.startswith('/'):
+            if self.remote_dir is None:
+                self.remote_dir = self.remote_cwd() or '/'
+                self.known_dirs.add(self.remote_dir)
+            path = posixpath.join(self.remote_dir, path)
+        return posixpath.normpath(path)
+
+    def _forget_dirs(self, path):
+        """Drops a remote directory and everything below it from the known_dirs cache.
+
+        Args:
+            path (str): Remote directory that was removed or renamed.
+        """
+        path = self._abs_remote(path)
+        prefix = path.rstrip('/') + '/'
+        for known in list(self.known_dirs):
+            if known == path or known.startswith(prefix):
+                self.known_dirs.discard(known)
+
+    def _server_id(self):
+        """Returns "user@host:port", the key of this server in the local transfer journal."""
+        return f"{self.user}@{self.host}:{self.port}"
+
+    def _listing_changed(self, path, tree=False):
+        """Drops cached listings affected by creating, removing or renaming a remote path.
+
+        Args:
+            path (str): The remote path that changed.
+            tree (bool): True if path is a directory whose own listings are stale too.
+        """
+        path = self._abs_remote(path)
+        self.listing_cache.invalidate(posixpath.dirname(path))
+        if tree:
+            self.listing_cache.invalidate(path, tree=True)
+
+    def _chunk_sizer(self):
+        """Returns a ChunkSizer with this session's buffer settings, one per transfer."""
+        return ChunkSizer(self.chunk_size, self.max_chunk_size, self.adaptive_chunks)
+
+    def _tune_socket(self, sock):
+        """Applies socket_buffer as SO_RCVBUF/SO_SNDBUF (before connect/listen, so the TCP window can use it)."""
+        if self.socket_buffer > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.socket_buffer)
+
+    def set_buffer(self, args=""):
+        """Shows or changes the transfer buffer settings of this session.
+
+        Args:
+            args (str): "" to show, "auto"/"fixed" to switch adaptive mode,
+                or "<chunk_kb> [socket_kb]" to set the sizes.
+        """
+        parts = args.split()
+        try:
+            if parts and parts[0] in ('auto', 'fixed'):
+                self.adaptive_chunks = parts[0] == 'auto'
+            elif parts:
+                chunk_size = int(parts[0]) * 1024
+                socket_buffer = int(parts[1]) * 1024 if len(parts) > 1 else self.socket_buffer
+                if chunk_size <= 0 or socket_buffer < 0:
+                    raise ValueError
+                self.chunk_size, self.socket_buffer = chunk_size, socket_buffer
+        except ValueError:
+            print("[ERROR] Usage: buffer [auto|fixed] | buffer <chunk_kb> [socket_kb]")
+            return
+        print(f"Chunk size: {self.chunk_size // 1024} KB"
+              + (f" (adaptive, up to {self.max_chunk_size // 1024} KB)" if self.adaptive_chunks else " (fixed)"))
+        print(f"Socket buffer: {f'{self.socket_buffer // 1024} KB' if self.socket_buffer else 'OS default'}")
+
+    def _run(self, coro):
+        """Runs a coroutine of the asyncio core on the shared event loop and returns its result.
+
+        The session settings the core uses (AsyncFTPClient.SETTINGS: passive
+        mode, active-mode test address, reply timeout, socket buffer size)
+        are copied into it first, so shell commands that change them apply
+        to the next call. Chunk sizes and the transfer mode are passed per
+        transfer instead (a ChunkSizer, the `ascii` flag of send_file).
+        """
+        for attr in AsyncFTPClient.SETTINGS:
+            setattr(self.core, attr, getattr(self, attr))
+        return EventLoopThread.shared().run(coro)
 
     def _send_cmd(self, cmd):
         """
         Sends a command string to the FTP server over the control connection.
 
-        This is a helper method that appends the necessary FTP line ending (\r\n),
-        encodes the command string into bytes, and then sends it entirely
-        to the server through the control socket.
+        This is a helper method: it appends the necessary FTP line ending
+        (\r\n), encodes the command string into bytes, and queues it on the
+        control connection's transport in the event loop thread. It does not
+        wait for the loop, so a command followed by _read_reply() costs a
+        single hop into the loop; calls run on the loop in order.
 
         Args:
             cmd (str): The FTP command string to send (e.g., "USER myuser", "PASV", "RETR myfile.txt").
+
+        Raises:
+            ConnectionError: If the control connection is not open.
         """
         # helper method đóng vai trò là giao diện chính để gửi các lệnh điều khiển từ client đến máy chủ FTP
         # Tiêu chuẩn FTP: mỗi lệnh phải được kết thúc bằng một cặp ký tự Carriage Return (CR) theo sau bởi Line Feed (LF).
-        # Encode cmd string thành bytes để gửi
-        self.control_sock.sendall((cmd + '\r\n').encode())
+        if self.core is None or self.core.writer is None:
+            raise ConnectionError("Not connected to an FTP server")
+        EventLoopThread.shared().call(self.core.writer.write, (cmd + '\r\n').encode())
+
+    def _send_pipelined(self, commands):
+        """Sends several commands without waiting for each reply.
+
+        Commands are written in batches of PIPELINE_BATCH, then the replies
+        are read back in order, so a batch costs about one round trip
+        instead of one per command. Only use it for commands that produce
+        exactly one reply (no data transfers).
+
+        Args:
+            commands (list[str]): The commands, e.g. ["MKD a", "MKD a/b"].
+
+        Returns:
+            list[FTPReply]: One reply per command, in the same order.
+
+        Raises:
+            socket.timeout: If a reply does not arrive within reply_timeout.
+            ConnectionError: If the server closed the control connection.
+        """
+        return self._run(self.core.send_pipelined(commands))
+
+    def _read_reply(self):
+        """Reads one complete reply, including multi-line replies.
+
+        A multi-line reply starts with "NNN-" and ends with the first line
+        that starts with the same code followed by a space ("NNN ").
+
+        Returns:
+            FTPReply: The parsed reply.
+
+        Raises:
+            socket.timeout: If the reply does not arrive within reply_timeout.
+            ConnectionError: If the server closed the control connection.
+        """
+        return self._run(self.core.read_reply())
 
     def _recv_response_blocking(self):
         """Receives a response from the FTP server, blocking until complete.
 
-        Waits for data on the control socket until a complete FTP response is received.
+        Returns as soon as the final line of the reply has arrived.
 
         Returns:
             str: The decoded server response.
@@ -204,18 +1629,8 @@ class RawFTPClient:
             socket.timeout: If no response is received within the set timeout.
             Exception: Any socket-related errors.
         """
-        self.control_sock.settimeout(5)
         try:
-            data = b""
-            while True:
-                part = self.control_sock.recv(BUFFER_SIZE)
-                data += part
-                # A simple way to detect the end of a multi-line FTP response
-                if len(part) < BUFFER_SIZE and (data.endswith(b'\r\n') or not part):
-                    break
-            decoded_data = data.decode().strip()
-            # print(f"[SERVER RESPONSE]\n---\n{decoded_data}\n---")
-            return decoded_data
+            return self._read_reply().text
         except socket.timeout:
             print("[ERROR] Timeout receiving response")
             return "[ERROR] Timeout receiving response"
@@ -223,115 +1638,6 @@ class RawFTPClient:
             print(f"[ERROR] {str(e)}")
             return f"[ERROR] {str(e)}"
 
-    def _open_data_connection(self):
-        """Opens a data connection for file transfers or directory listings.
-
-        Chooses passive mode (EPSV/PASV) or active mode (PORT) based on configuration.
-
-        Returns:
-            socket.socket|None: The data connection socket in passive mode, or None in active mode (waiting for accept).
-
-        Raises:
-            Exception: If neither EPSV nor PASV succeeds in passive mode, or if PORT fails in active mode.
-        """
-        # Passive Mode
-        if self.passive_mode:
-            # --- Modern Approach: Try EPSV first ---
-            try:
-                self._send_cmd("EPSV")
-                
-                resp = self._recv_response_blocking()
-                debug_logger.debug(f"EPSV response: {resp}")
-
-                if not resp.startswith('229'):
-                    raise Exception("Server does not support EPSV, falling back.")
-
-                # The EPSV response is like: "229 Entering Extended Passive Mode (|||64311|)"
-                match = re.search(r'\((\|\|\|(\d+)\|)\)', resp)
-                if not match:
-                    raise Exception("Cannot parse EPSV response")
-                
-                port = int(match.group(2))
-                
-                # For the data connection, we connect to the SAME HOST as the control connection.
-                data_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                data_sock.connect((self.host, port))
-                return data_sock
-            except Exception as e:
-                print(f"[WARN] EPSV failed: {e}. Trying legacy PASV.")
-                
-                self._send_cmd("PASV")
-                
-                # Decode data-connection ip and port sent from server
-                resp = self._recv_response_blocking()
-                debug_logger.debug(f"[DEBUG] PASV response: {resp}")  # debug thêm
-                if not resp.startswith('227'):
-                    raise Exception(f"PASV failed: {resp}")
-                match = re.search(r'\((.*?)\)', resp)
-                if not match:
-                    raise Exception("PASV response format invalid")
-                numbers = match.group(1).split(',')
-                if len(numbers) != 6:
-                    raise Exception("Invalid PASV address data")
-                ip = '.'.join(numbers[:4])
-                port = (int(numbers[4]) << 8) + int(numbers[5])
-                
-                # Create a connection to the ip and port of server
-                data_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                data_sock.connect((ip, port))
-                return data_sock
-        # Active Mode
-        else:
-            if self.local_test_mode:
-                # Dùng loopback IP cho test mode
-                # Khi này FTP client và FTP server đều chạy trên cùng một máy
-                ip = "127.0.0.1"
-            else:
-                # Tạo temporary UDP socket để lấy private IP của FTP client
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                try:
-                    # Kết nối ra ngoài (Google DNS)
-                    s.connect(("8.8.8.8", 80))
-                    # Lấy IP của chính socket mà hệ điều hành dùng để gửi gói tin ra (Private IP của máy)
-                    ip = s.getsockname()[0]
-                finally:
-                    # Đã lấy được private IP, đóng kết nối
-                    s.close()
-                    
-            # Tạo TCP socket
-            self.active_data_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Ràng buộc nó với một cổng ngẫu nhiên do hệ điều hành cấp phát
-            self.active_data_listener.bind(('', 0))
-            # Bắt đầu lắng nghe, settimeout tránh treo mãi nếu server không connect lại
-            self.active_data_listener.settimeout(10)
-            # Cho phép 1 kết nối
-            self.active_data_listener.listen(1)
-            # Lấy port ngẫu nhiên được tạo trước đó
-            port = self.active_data_listener.getsockname()[1]
-            debug_logger.debug(f"[DEBUG] Active mode: Sending PORT with IP = {ip}, Port = {port}")
-            
-            # Nếu ip là "192.168.1.10", thì ip.split('.') sẽ trả về ['192', '168', '1', '10']
-            # Lệnh PORT trong FTP yêu cầu địa chỉ IP được truyền dưới dạng bốn số nguyên được phân tách bằng dấu phẩy
-            ip_nums = ip.split('.')
-            # p1 là "byte cao" (most significant byte) của port
-            p1 = port >> 8
-            # p2 là "byte thấp" (least significant byte) của port
-            p2 = port & 0xFF
-
-            # Lệnh PORT: gửi từ FTP client đến FTP server khi client muốn thiết lập một kênh dữ liệu ở chế độ Active.
-            # Server sẽ tính lại port từ p1 và p2: port = (p1 * 256) + p2
-            self._send_cmd(f"PORT {','.join(ip_nums)},{p1},{p2}")
-            resp = self._recv_response_blocking()
-            
-            # "200 Command okay."
-            # Xác nhận từ server rằng nó đã nhận và hiểu lệnh PORT, và nó biết nơi cần kết nối để thiết lập kênh dữ liệu.
-            if not resp.startswith('200'):
-                # Clean up nếu connection không thành công
-                self.active_data_listener.close()
-                self.active_data_listener = None
-                raise Exception(f"PORT failed: {resp}")
-            return None  # chủ động trả về None để phân biệt
-
     def status(self):
         """Prints the current FTP client status, including mode and connection state."""
         print("Passive Mode:", self.passive_mode)
@@ -343,6 +1649,15 @@ class RawFTPClient:
         self.prompt = not self.prompt
         print(f"Prompt mode {'enabled' if self.prompt else 'disabled'}")
 
+    def toggle_progress(self):
+        """Toggles the progress bars of get, put and virus scans."""
+        self.show_progress = not self.show_progress
+        print(f"Progress bars {'enabled' if self.show_progress else 'disabled'}")
+
+    def _progress(self, label, total=None, quiet=False, start=0):
+        """Returns a TransferProgress for one transfer, disabled when quiet or progress is off."""
+        return TransferProgress(label, total, enabled=self.show_progress and not quiet, start=start)
+
     def set_ascii(self):
         """Sets the file transfer mode to ASCII and informs the server."""
         self.transfer_mode = 'ascii'
@@ -383,60 +1698,131 @@ class RawFTPClient:
         """Lists files on the server in the current working directory.
 
         Uses LIST command over a data connection in passive or active mode.
-        Prints the directory listing to stdout.
+        Prints the directory listing to stdout. A listing fetched less than
+        listing_cache.ttl seconds ago is printed from the cache.
         """
         try:
-            if self.passive_mode:
-                data_sock = self._open_data_connection()
-            else:
-                self._open_data_connection()
+            self._cached_listing("LIST", echo=True)
+        except Exception as e:
+            print(f"[ERROR] {str(e)}")
 
-            self._send_cmd("LIST")
-            resp = self._recv_response_blocking()
-            if not resp.startswith("150"):
-                print(f"[ERROR] {resp}")
-                if self.passive_mode:
-                    data_sock.close()
-                else:
-                    self.active_data_listener.close()
-                    self.active_data_listener = None
-                return
+    def _read_listing(self, command, echo=False):
+        """Runs a listing command (LIST or MLSD) and returns its raw output.
 
-            # active
-            if not self.passive_mode:
-                try:
-                    data_sock, _ = self.active_data_listener.accept()
-                except socket.timeout:
-                    print("[ERROR] Timeout waiting for server to connect in active mode.")
-                    self.active_data_listener.close()
-                    self.active_data_listener = None
-                    return
-                self.active_data_listener.close()
-                self.active_data_listener = None
+        Args:
+            command (str): The full command, e.g. "MLSD dir".
+            echo (bool): If True, the listing and the server's final reply are printed as they arrive.
 
+        Returns:
+            bytes|None: Everything received on the data connection, or None on error.
+        """
+        callback = None
+        if echo:
+            # Ký tự UTF-8 có thể bị cắt giữa hai lần đọc; callback chạy trên luồng event loop
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            callback = lambda chunk: print(decoder.decode(chunk), end='')
+        try:
+            listing, reply = self._run(self.core.list(command, callback, self._chunk_sizer()))
+        except Exception as e:
+            print(f"[ERROR] {e}")
+            return None
+        if echo:
+            print(reply)
+        return listing
 
-            while True:
-                data = data_sock.recv(BUFFER_SIZE)
-                if not data:
-                    break
-                print(data.decode(), end='')
+    def _cached_listing(self, command, path="", echo=False, fresh=False):
+        """Returns a directory listing from listing_cache, or runs the command and caches it.
 
-            data_sock.close()
-            print(self._recv_response_blocking())
+        Args:
+            command (str): "LIST" or "MLSD".
+            path (str): Remote directory; empty for the current directory.
+            echo (bool): If True, the listing is printed, followed by the server's final reply (or a cache note).
+            fresh (bool): If True, the cache is not read (but still refreshed).
+
+        Returns:
+            bytes|None: The raw listing, or None on error.
+        """
+        abs_path = self._abs_remote(path or '.')
+        listing = None if fresh else self.listing_cache.get(command, abs_path)
+        if listing is not None:
+            if echo:
+                print(listing.decode(errors='replace'), end='')
+                print("[INFO] Listing served from cache.")
+            return listing
+        listing = self._read_listing(f"{command} {path}" if path else command, echo)
+        if listing is not None:
+            self.listing_cache.put(command, abs_path, listing)
+        return listing
+
+    def list_dir(self, path="", fresh=False):
+        """Lists a remote directory as structured entries.
+
+        Uses MLSD when the server announces MLST in FEAT, so types, sizes and
+        modification times come from machine-readable facts; otherwise falls
+        back to parsing Unix-style LIST output.
+
+        Args:
+            path (str): Remote directory; empty for the current directory.
+            fresh (bool): If True, always ask the server instead of using listing_cache.
+
+        Returns:
+            list[RemoteEntry]|None: The entries (without "." and ".."), or None on error.
+        """
+        use_mlsd = self.has_feature("MLST")
+        command = "MLSD" if use_mlsd else "LIST"
+        listing = self._cached_listing(command, path, fresh=fresh)
+        if listing is None:
+            return None
+        parse = parse_mlsx_line if use_mlsd else parse_list_line
+        entries = []
+        for line in listing.decode(errors='replace').splitlines():
+            entry = parse(line)
+            if entry is None or entry.type in ('cdir', 'pdir') or entry.name in ('.', '..'):
+                continue
+            entries.append(entry)
+        return entries
+
+    def stat_remote(self, path):
+        """Asks the server for the facts of one path with MLST.
+
+        Args:
+            path (str): Remote file or directory.
 
+        Returns:
+            RemoteEntry|None: The entry, or None if MLST is unsupported or the path does not exist.
+        """
+        if not self.has_feature("MLST"):
+            return None
+        self._send_cmd(f"MLST {path}")
+        try:
+            reply = self._read_reply()
         except Exception as e:
             print(f"[ERROR] {str(e)}")
-
-    def cd(self, path):
+            return None
+        if reply.code != 250:
+            return None
+        # 250-Listing path
+        #  type=dir;modify=...; /path
+        # 250 End
+        for line in reply.lines[1:-1]:
+            if line.startswith(' '):
+                return parse_mlsx_line(line)
+        return None
+
+    def cd(self, path, quiet=False):
         """Changes the current working directory on the server.
 
         Args:
             path (str): Target directory path on the server.
+            quiet (bool): If True, only a failure is printed.
         """
         self._send_cmd(f"CWD {path}")
         resp = self._recv_response_blocking()
         if resp.startswith("250"):
-            print(f"[OK] {resp}")
+            # Thư mục hiện tại đã đổi, lần sau cần đường dẫn tuyệt đối sẽ hỏi lại bằng PWD
+            self.remote_dir = None
+            if not quiet:
+                print(f"[OK] {resp}")
         else:
             print(f"[ERROR] {resp}")
 
@@ -454,6 +1840,9 @@ class RawFTPClient:
         """
         self._send_cmd(f"MKD {dirname}")
         resp = self._recv_response_blocking()
+        if resp.startswith("257"):
+            self.known_dirs.add(self._abs_remote(dirname))
+            self._listing_changed(dirname)
         # if resp.startswith("257"):
         #     print(f"[OK] {resp}")
         # else:
@@ -468,6 +1857,9 @@ class RawFTPClient:
         """
         self._send_cmd(f"RMD {dirname}")
         resp = self._recv_response_blocking()
+        if resp.startswith("250"):
+            self._forget_dirs(dirname)
+            self._listing_changed(dirname, tree=True)
         print(f"Response: {resp}")
         # if resp.startswith("250"):
         #     print(f"[OK] {resp}")
@@ -481,7 +1873,28 @@ class RawFTPClient:
             filename (str): Name of the file to delete.
         """
         self._send_cmd(f"DELE {filename}")
-        print(self._recv_response_blocking())
+        resp = self._recv_response_blocking()
+        if resp.startswith("250"):
+            self._listing_changed(filename)
+        print(resp)
+
+    def mdelete(self, filenames):
+        """Deletes several files on the server with one pipelined batch of DELE commands.
+
+        Args:
+            filenames (list[str]): Names of the files to delete.
+        """
+        try:
+            replies = self._send_pipelined([f"DELE {name}" for name in filenames])
+        except Exception as e:
+            print(f"[ERROR] {str(e)}")
+            return
+        for name, reply in zip(filenames, replies):
+            if reply.code == 250:
+                self._listing_changed(name)
+                print(f"[OK] Deleted {name}")
+            else:
+                print(f"[ERROR] {name}: {reply.text}")
 
     def rename(self, from_name, to_name):
         """Renames a file on the server.
@@ -495,15 +1908,29 @@ class RawFTPClient:
         if resp.startswith('350'):
             self._send_cmd(f"RNTO {to_name}")
             print(self._recv_response_blocking())
+            # from_name có thể là thư mục: bỏ nó (và các thư mục con) khỏi cache
+            self._forget_dirs(from_name)
+            self._listing_changed(from_name, tree=True)
+            self._listing_changed(to_name)
         else:
             print(resp)
 
-    def get(self, filename, destination_path=None):
+    def get(self, filename, destination_path=None, quiet=False, mtime=None, size=None, segments=None):
         """Downloads a file from the server.
 
+        In binary mode, a file of at least segment_threshold bytes is split
+        into byte ranges fetched over several sessions (see _segmented_get).
+
         Args:
             filename (str): Name of the file to download.
             destination_path (str|None): Local path or directory to save the file.
+            quiet (bool): If True, only errors are printed (used by parallel downloads).
+            mtime (int|None): Remote modification time to give the local copy (used by mirror).
+            size (int|None): Remote size if already known from a listing (saves a SIZE command).
+            segments (int|None): Number of segments; defaults to self.segments, 1 = single stream.
+
+        Returns:
+            bool: True if the file was downloaded.
         """
         if destination_path:
             if os.path.isdir(destination_path):
@@ -513,79 +1940,331 @@ class RawFTPClient:
         else:
             local_path = os.path.basename(filename)
 
+        # Tiếp tục file tải dở (có trong journal) bằng REST, chỉ ở chế độ binary
+        offset = 0
+        resume_key = None
+        resume_segments = False
+        if self.journal and self.transfer_mode == 'binary':
+            resume_key = (self._server_id(), 'get', self._abs_remote(filename), os.path.abspath(local_path))
+            partial = self.journal.lookup_partial(*resume_key) if os.path.isfile(local_path) else None
+            if partial:
+                remote_size = self.remote_size(filename)
+                local_size = os.path.getsize(local_path)
+                if partial[0] is not None and partial[0] == remote_size:
+                    # Segmented download bị ngắt: chỉ tải lại các đoạn còn thiếu
+                    size = remote_size
+                    resume_segments = True
+                elif partial[0] is None and remote_size is not None and local_size < remote_size:
+                    offset = local_size
+        journaled = offset > 0
+
+        # File lớn: tải song song nhiều đoạn byte trên nhiều session
+        segments = self.segments if segments is None else segments
+        if (self.mmap_downloads or (self.show_progress and not quiet)) and size is None \
+                and self.transfer_mode == 'binary':
+            # Cần kích thước file cho mmap và để hiện phần trăm trên progress bar
+            size = self.remote_size(filename)
+        if resume_segments or (not offset and segments > 1 and self.transfer_mode == 'binary'):
+            if size is None:
+                size = self.remote_size(filename)
+            if resume_segments or (size is not None and size >= self.segment_threshold):
+                if not self._segmented_get(filename, local_path, size, max(segments, 1), quiet, resume_key):
+                    return False
+                if mtime is not None:
+                    os.utime(local_path, (mtime, mtime))
+                if not quiet:
+                    print(f"Downloaded {filename} -> {local_path}")
+                return True
+
+        try:
+            # Mở kênh dữ liệu, REST (nếu tải tiếp) và RETR trên asyncio core
+            data_sock, offset = self._run(self.core.start_transfer(f"RETR {filename}", offset))
+            journaled = journaled and offset > 0
+            try:
+                os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+                if offset and not quiet:
+                    print(f"[INFO] Resuming {filename} at byte {offset}")
+                received = offset
+                sizer = self._chunk_sizer()
+                total = size if self.transfer_mode == 'binary' else None
+                with self._progress(f"Downloading '{filename}':", total, quiet, offset) as progress:
+                    if (self.mmap_downloads and self.transfer_mode == 'binary' and size is not None
+                            and size >= MMAP_MIN_SIZE and offset < size):
+                        if resume_key and not journaled:
+                            self.journal.start_partial(*resume_key)
+                            journaled = True
+                        received = self._receive_mmap(data_sock, local_path, offset, size, sizer, progress)
+                    else:
+                        codec = AsciiCodec('decode') if self.transfer_mode == 'ascii' else None
+                        with open(local_path, 'ab' if offset else 'wb') as f:
+                            def sink(chunk):
+                                # Chạy trên luồng event loop với từng đoạn của buffer dùng lại (recv_into)
+                                nonlocal received, journaled
+                                # ASCII: CRLF -> LF, kể cả khi CRLF bị cắt giữa hai lần đọc
+                                f.write(codec.convert(chunk) if codec else chunk)
+                                received += len(chunk)
+                                if resume_key and not journaled and received >= RESUME_MIN_SIZE:
+                                    # File lớn: ghi vào journal để lần sau có thể tải tiếp
+                                    self.journal.start_partial(*resume_key)
+                                    journaled = True
+                            self._run(self.core.receive(data_sock, sink, sizer, progress=progress))
+                            if codec:
+                                f.write(codec.flush())
+            except BaseException:
+                data_sock.close()
+                raise
+            resp = self._run(self.core.end_transfer(data_sock)).text
+            if not resp.startswith(TRANSFER_COMPLETE):
+                print(f"[ERROR] {resp}")
+                return False
+            if size is not None and self.transfer_mode == 'binary' and received < size:
+                print(f"[ERROR] Transfer of {filename} stopped at byte {received} of {size}")
+                return False
+            if journaled:
+                self.journal.finish_partial(*resume_key)
+            if mtime is not None:
+                os.utime(local_path, (mtime, mtime))
+            if not quiet:
+                print(resp)
+                print(f"Downloaded {filename} -> {local_path}")
+            return True
+
+        except Exception as e:
+            print(f"[ERROR] {str(e)}")
+        return False
+
+    def _segmented_get(self, filename, local_path, size, segments, quiet=False, resume_key=None):
+        """Downloads one file as byte ranges over parallel sessions.
+
+        The local file is sized to `size`; at most `segments` sessions take
+        ranges from a queue and fetch each with REST + RETR, writing it at
+        its own offset. With the journal
+        (`resume_key`), every finished range is recorded, so an interrupted
+        download only fetches the missing ranges next time. Ranges that fail
+        in parallel are retried one by one on this session.
+
+        If the download still fails, the file is cut back to the end of the
+        last downloaded range (removed if there is no journal), so it is
+        never left full-size with gaps that look complete.
+
+        Args:
+            filename (str): Remote file.
+            local_path (str): Local destination.
+            size (int): Remote file size in bytes.
+            segments (int): Number of sessions (and of ranges for a fresh download).
+            quiet (bool): If True, only errors are printed.
+            resume_key (tuple|None): (server, 'get', remote_path, local_path) journal key.
+
+        Returns:
+            bool: True if every range was downloaded.
+        """
+        range_key = (resume_key[0], resume_key[2], resume_key[3]) if resume_key else None
+        done = self.journal.lookup_ranges(*range_key, size) if resume_key else []
+        ranges, missing, seg_len = split_ranges(done, size, segments)
+
+        os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+        with open(local_path, 'r+b' if done and os.path.isfile(local_path) else 'wb') as f:
+            f.truncate(size)
+        if resume_key:
+            self.journal.start_partial(*resume_key, size)
+        if not quiet:
+            if done:
+                print(f"[INFO] Resuming {filename}: {size - missing} of {size} bytes already downloaded")
+            print(f"[get] {filename}: {len(ranges)} segments of {seg_len / (1024 * 1024):.1f} MB"
+                  f" over {min(segments, len(ranges))} sessions")
+
+        failed = []
+
+        def fetch(session, start, end, progress):
+            reached = session._fetch_range(filename, local_path, start, end, progress)
+            if reached > start:
+                if resume_key:
+                    self.journal.record_range(*range_key, size, start, reached)
+                done.append((start, reached))
+            if reached < end:
+                failed.append((reached, end))
+
+        # Mỗi luồng giữ một session và lấy lần lượt các đoạn trong hàng đợi:
+        # không bao giờ mở quá `segments` kết nối, dù có nhiều khoảng trống
+        pending = queue.Queue()
+        for item in ranges:
+            pending.put(item)
+
+        def worker(pool, progress):
+            try:
+                session = pool.acquire()
+            except Exception as e:
+                # Các đoạn còn lại do luồng khác lấy, hoặc được thử lại ở dưới
+                sys.stdout.write(f"[ERROR] Could not open a parallel session: {e}\n")
+                return
+            try:
+                while True:
+                    try:
+                        start, end = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    fetch(session, start, end, progress)
+            finally:
+                pool.release(session)
+
+        threads = []
+        complete = False
+        try:
+            with self._progress(f"Downloading '{filename}':", size, quiet, size - missing) as progress:
+                if ranges:
+                    sessions = min(segments, len(ranges))
+                    with FTPSessionPool(self, sessions) as pool:
+                        threads = [threading.Thread(target=worker, args=(pool, progress), daemon=True)
+                                   for _ in range(sessions)]
+                        for t in threads:
+                            t.start()
+                        for t in threads:
+                            t.join()
+                    while not pending.empty():
+                        failed.append(pending.get_nowait())
+                # Đoạn lỗi (ví dụ server giới hạn số kết nối): thử lại lần lượt trên session này
+                retry, failed[:] = list(failed), []
+                if retry:
+                    print(f"[WARN] {len(retry)} segment(s) of {filename} failed, retrying on this session.")
+                for start, end in retry:
+                    fetch(self, start, end, progress)
+            complete = not failed
+            if complete and resume_key:
+                self.journal.finish_partial(*resume_key)
+        finally:
+            if not complete:
+                # Chờ các luồng còn chạy dừng lại (session đã đóng) trước khi cắt file
+                for t in threads:
+                    t.join(5)
+                reached = max((end for _, end in done), default=0)
+                if resume_key and reached:
+                    with open(local_path, 'r+b') as f:
+                        f.truncate(reached)
+                else:
+                    os.remove(local_path)
+        return not failed
+
+    def _fetch_range(self, filename, local_path, start, end, progress=None):
+        """Downloads bytes [start, end) of a remote file into the same range of a local file.
+
+        Args:
+            progress (TransferProgress|None): Shared progress of the whole file.
+
+        Returns:
+            int: Offset reached; `end` if the whole range was received, and
+            bytes [start, offset) are on disk either way.
+        """
+        pos = start
         try:
-            data_sock = None # Initialize to None
-            if self.passive_mode:
-                data_sock = self._open_data_connection()
-            else:
-                self._open_data_connection()
-                self._send_cmd(f"RETR {filename}")  # GỬI TRƯỚC KHI accept()
-                resp = self._recv_response_blocking()
-                if not resp.startswith('150'):
-                    print(f"[ERROR] {resp}")
-                    return
-                try:
-                    data_sock, _ = self.active_data_listener.accept()
-                except socket.timeout:
-                    print("[ERROR] Timeout waiting for server to connect in active mode.")
-                    self.active_data_listener.close()
-                    self.active_data_listener = None
-                    return
-                self.active_data_listener.close()
-                self.active_data_listener = None
+            data_sock, offset = self._run(self.core.start_transfer(f"RETR {filename}", start))
+            try:
+                if offset != start:
+                    # Server không nhận REST: không tải được đoạn này
+                    raise Exception(f"REST {start} refused for {filename}")
+                sizer = self._chunk_sizer()
+                if self.mmap_downloads:
+                    # File đã được cấp phát đủ kích thước, nhận thẳng vào vùng nhớ map của đoạn này
+                    with open(local_path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+                        view = memoryview(mm)[start:end]
+                        try:
+                            pos += self._run(self.core.receive_into(data_sock, view, sizer, progress))
+                        finally:
+                            view.release()
+                else:
+                    with open(local_path, 'r+b') as f:
+                        f.seek(start)
+
+                        def sink(chunk):
+                            nonlocal pos
+                            f.write(chunk)
+                            pos += len(chunk)
+
+                        self._run(self.core.receive(data_sock, sink, sizer, end - start, progress))
+            finally:
+                # Đóng kết nối dữ liệu ở cuối đoạn: server hủy phần còn lại (426/451), hoặc 226 nếu đã gửi hết
+                self._run(self.core.end_transfer(data_sock))
+        except Exception as e:
+            sys.stdout.write(f"[ERROR] {str(e)}\n")
+        return pos
 
-            if data_sock is None and self.passive_mode:
-                print("[ERROR] Failed to establish a data socket in passive mode.")
-                return
+    def _receive_mmap(self, data_sock, local_path, start, size, sizer, progress):
+        """Receives a download straight into a memory map of the local file.
 
-            if self.passive_mode:
-                self._send_cmd(f"RETR {filename}")
-                resp = self._recv_response_blocking()
-                if not resp.startswith('150'):
-                    print(f"[ERROR] Server did not respond with '150 File status okay'. Aborting download.")
-                    print(f"[ERROR] {resp}")
-                    if data_sock:
-                        data_sock.close()
-                    return
+        The file is extended to `size` and mapped; the core's recv_into()
+        writes each chunk directly into the mapped pages, so no intermediate
+        buffer or write() call is needed. If the transfer stops early, the file is cut
+        back to the bytes actually received, so it can be resumed.
 
-            # debug_logger.debug(f"[DEBUG] Server is ready to send. Receiving data into '{local_path}'...")
-            os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
-            with open(local_path, 'wb') as f:
-                while True:
-                    data = data_sock.recv(BUFFER_SIZE)
-                    # - Chuỗi bytes rỗng (b''), điều đó có nghĩa là bên kia của kết nối (tức là FTP server) 
-                    # đã thực hiện lệnh close() trên socket của nó, báo hiệu rằng nó đã gửi tất cả dữ liệu và sẽ không gửi gì thêm nữa.
-                    # - recv() sẽ trả về một chuỗi bytes rỗng (b'') CHỈ VÀ CHỈ KHI bên kia của kết nối đã đóng nửa kết nối gửi của nó 
-                    # (hoặc toàn bộ kết nối). Đây là cách tiêu chuẩn để phát hiện "end of stream" trong TCP.
-                    if not data:
-                        break
-                    if self.transfer_mode == 'ascii':
-                        data = data.replace(b'\r\n', b'\n')
-                    f.write(data)
-            data_sock.close()
-            print(self._recv_response_blocking())
-            print(f"Downloaded {filename} -> {local_path}")
+        Args:
+            data_sock (socket.socket): The data connection.
+            local_path (str): Local file; its first `start` bytes are kept.
+            start (int): Offset the server starts sending from (REST).
+            size (int): Full size of the remote file.
+            sizer (ChunkSizer): Chunk size for each recv_into().
+            progress (TransferProgress): Progress of the download.
 
-        except Exception as e:
-            print(f"[ERROR] {str(e)}")
+        Returns:
+            int: Offset reached (start + bytes received).
+        """
+        received = start
+        with open(local_path, 'r+b' if start else 'w+b') as f:
+            f.truncate(size)
+            try:
+                with mmap.mmap(f.fileno(), size) as mm:
+                    view = memoryview(mm)[start:size]
+                    try:
+                        received += self._run(self.core.receive_into(data_sock, view, sizer, progress))
+                    finally:
+                        view.release()
+            finally:
+                if received < size:
+                    f.truncate(received)
+        return received
 
     def make_remote_dirs(self, path):
         """Creates nested directories on the server.
 
+        Only the components below the deepest directory already in
+        known_dirs are sent as MKD, so uploading many files into the same
+        tree costs no extra commands once the tree exists.
+
         Args:
             path (str): Path to create on the server.
         """
         dirs = path.replace("\\", "/").split("/")
-        curr = ""
+        curr = "/" if path.startswith(("/", "\\")) else ""
+        paths = []
         for d in dirs:
             if not d:
                 continue
-            curr = f"{curr}/{d}" if curr else d
-            self._send_cmd(f"MKD {curr}")
-            resp = self._recv_response_blocking()
-            if not resp.startswith("257") and not "File exists" in resp:
-                if not resp.startswith("550"):
-                    print(f"[WARN] Failed to create remote dir '{curr}': {resp}")
+            curr = posixpath.join(curr, d) if curr else d
+            paths.append(curr)
+        if not paths:
+            return
+
+        # Thư mục sâu nhất đã biết là tồn tại thì mọi thư mục cha cũng tồn tại
+        missing = []
+        for curr in reversed(paths):
+            if self._abs_remote(curr) in self.known_dirs:
+                break
+            missing.append(curr)
+        if not missing:
+            return
+        missing.reverse()
+
+        # Gửi tất cả lệnh MKD cùng lúc rồi mới đọc các phản hồi (1 RTT thay vì 1 RTT mỗi cấp)
+        try:
+            replies = self._send_pipelined([f"MKD {p}" for p in missing])
+        except Exception as e:
+            print(f"[ERROR] {str(e)}")
+            return
+        for curr, reply in zip(missing, replies):
+            resp = reply.text
+            if resp.startswith("257") or "exists" in resp.lower():
+                self.known_dirs.add(self._abs_remote(curr))
+                self._listing_changed(curr)
+            elif not resp.startswith("550"):
+                print(f"[WARN] Failed to create remote dir '{curr}': {resp}")
 
     def put(self, filepath, remote_rel_path=""):
         """Uploads a file to the server after scanning with ClamAV.
@@ -605,68 +2284,66 @@ class RawFTPClient:
         if result != "OK":
             print(f"[WARNING] Upload aborted. Scan result: {result}")
             return
+        self._store_file(filepath, remote_rel_path)
+
+    def _store_file(self, filepath, remote_rel_path="", quiet=False):
+        """Uploads a local file that has already passed the virus scan.
+
+        Args:
+            filepath (str): Local path of the file to upload.
+            remote_rel_path (str): Relative remote path to store the file.
+            quiet (bool): If True, no progress bar is shown (parallel uploads).
+        """
         try:
             remote_path = os.path.join(remote_rel_path, os.path.basename(filepath)).replace('\\', '/')
             remote_dir = os.path.dirname(remote_path)
             if remote_dir:
                 self.make_remote_dirs(remote_dir)
 
-            if self.passive_mode:
-                data_sock = self._open_data_connection()
-                self._send_cmd(f"STOR {remote_path}")
-                resp = self._recv_response_blocking()
-                if not resp.startswith('150'):
-                    print(f"[ERROR] {resp}")
-                    return
-            # Put - Active mode
-            else:
-                # Thiết lập kênh Active tới FTP client
-                # Sau khi chạy xong, FTP client đã chuyển sang trạng thái sẵn sàng lắng nghe một kết nối dữ liệu đến từ server. 
-                # Nó đã thông báo cho server biết nơi nó đang lắng nghe, và server cũng đã xác nhận điều đó.
-                self._open_data_connection()
-                # STOR: client gửi data
-                # Lệnh này yêu cầu máy chủ tạo hoặc ghi đè một file trên hệ thống của nó với tên là <remote_path> 
-                # và chuẩn bị nhận dữ liệu cho file đó.
-                self._send_cmd(f"STOR {remote_path}")  # Gửi STOR TRƯỚC khi accept
-                resp = self._recv_response_blocking()
-                if not resp.startswith('150'):
-                    print(f"[ERROR] {resp}")
-                    return
-                # Chặn thực thi chương trình cho đến khi máy chủ FTP tạo một kết nối đến socket đang lắng nghe của client
-                try:
-                    # Trước khi gọi accept(), đã có một socket được gọi là socket lắng nghe (self.active_data_listener). 
-                    # Socket này không dùng để gửi hay nhận dữ liệu. 
-                    # Nhiệm vụ duy nhất của nó là "ngồi chờ" và lắng nghe các yêu cầu kết nối đến từ các máy khác.
-                    # active_data_listener được tạo khi chạy self._open_data_connection()
-                    data_sock, _ = self.active_data_listener.accept()
-                # Cơ chế khi chờ quá lâu
-                except socket.timeout:
-                    print("[ERROR] Timeout waiting for server to connect in active mode.")
-                    self.active_data_listener.close()
-                    self.active_data_listener = None
-                    return
-                # Socket từ client đến server không cần thiết nữa, chỉ gửi dữ liệu qua socket từ server tới client
-                self.active_data_listener.close()
-                self.active_data_listener = None
-
-            # Client mở file cục bộ (filepath) ở chế độ nhị phân ('rb')
-            with open(filepath, 'rb') as f:
-                while True:
-                    # Trong vòng lặp, client đọc từng khối dữ liệu (BUFFER_SIZE bytes) từ file.
-                    data = f.read(BUFFER_SIZE)
-                    if not data:
-                        break
-                    if self.transfer_mode == 'ascii':
-                        # Nếu transfer_mode là ascii, thay thế \n (Line Feed) bằng cặp \r\n (Carriage Return + Line Feed). 
-                        # Đây là yêu cầu của FTP khi truyền file văn bản ở chế độ ASCII để đảm bảo tính tương thích giữa các OS.
-                        data = data.replace(b'\n', b'\r\n')
-                    # Gửi data
-                    data_sock.sendall(data)
-            # Đóng data channel khi đã hoàn tất gửi
-            data_sock.close()
-            
-            # Phản hồi từ server
-            print(self._recv_response_blocking())
+            # File lớn được ghi vào journal; nếu lần upload trước bị ngắt thì gửi tiếp phần còn lại
+            offset = 0
+            resume_key = None
+            stat = os.stat(filepath)
+            # SHA-256 đã tính lúc quét (nếu file không đổi từ đó), ghi vào journal sau khi upload
+            scanned = self.scan_digests.pop(os.path.abspath(filepath), None)
+            sha256 = scanned[2] if scanned and scanned[:2] == (stat.st_size, stat.st_mtime_ns) else None
+            if self.journal and self.transfer_mode == 'binary' and stat.st_size >= RESUME_MIN_SIZE:
+                resume_key = (self._server_id(), 'put', self._abs_remote(remote_path), os.path.abspath(filepath))
+                if self.journal.lookup_partial(*resume_key) == (stat.st_size, stat.st_mtime_ns):
+                    remote_size = self.remote_size(remote_path)
+                    if remote_size and remote_size < stat.st_size:
+                        offset = remote_size
+                self.journal.start_partial(*resume_key, stat.st_size, stat.st_mtime_ns)
+            # STOR (REST + STOR, hoặc APPE nếu server không có REST cho STOR) trên asyncio core
+            data_sock, offset = self._run(self.core.start_transfer(f"STOR {remote_path}", offset))
+            try:
+                if offset:
+                    print(f"[INFO] Resuming upload of {filepath} at byte {offset}")
+                # Client mở file cục bộ (filepath) ở chế độ nhị phân ('rb')
+                total = stat.st_size if self.transfer_mode == 'binary' else None
+                with open(filepath, 'rb') as f, \
+                        self._progress(f"Uploading '{os.path.basename(filepath)}':", total, quiet, offset) as progress:
+                    # Binary: sendfile, kernel gửi thẳng từ file ra socket; ASCII: \n -> \r\n qua AsciiCodec
+                    self._run(self.core.send_file(data_sock, f, offset, self._chunk_sizer(),
+                                                  progress if progress.enabled else None,
+                                                  ascii=self.transfer_mode == 'ascii'))
+            except BaseException:
+                data_sock.close()
+                raise
+
+            # Đóng data channel khi đã hoàn tất gửi, đọc phản hồi từ server
+            resp = self._run(self.core.end_transfer(data_sock)).text
+            print(resp)
+            if resp.startswith(TRANSFER_COMPLETE):
+                self._listing_changed(remote_path)
+                if resume_key:
+                    self.journal.finish_partial(*resume_key)
+                if self.journal:
+                    self.journal.record_upload(self._server_id(), self._abs_remote(remote_path),
+                                               stat.st_size, stat.st_mtime_ns, sha256)
+            if resp.startswith(TRANSFER_COMPLETE) and remote_dir:
+                # STOR thành công nên thư mục đích chắc chắn tồn tại (kể cả khi MKD trả về 550 chung chung)
+                self.known_dirs.add(self._abs_remote(remote_dir))
             # In kết quả ra terminal cho user
             print(f"Uploaded {filepath} -> {remote_path}")
         except Exception as e:
@@ -675,110 +2352,589 @@ class RawFTPClient:
     def mput(self, args):
         """Uploads multiple files matching a pattern.
 
+        When more than one file is selected, scanning runs in a background
+        thread up to `pipeline_depth` files ahead of the uploads, so the agent
+        and the FTP data connection are busy at the same time.
+
+        With "-j N", files are spread over N parallel FTP sessions instead;
+        every file is still scanned before it is uploaded.
+
+        Files the journal shows were already uploaded unchanged to the same
+        remote path (and still have that size on the server) are skipped, so
+        running an interrupted mput again only sends what is left.
+
         Args:
-            args (str): File pattern or directory for upload.
+            args (str): File pattern or directory for upload, optionally with "-j N".
         """
         import glob
         parts = args.strip().split()
         uploaded = set()
+        selected = []
 
-        def collect_files(path, base_dir=""):
-            if os.path.isfile(path):
-                yield (path, base_dir)
-            elif os.path.isdir(path):
-                for root, _, files in os.walk(path):
-                    rel_path = os.path.relpath(root, base_dir or os.path.dirname(path))
-                    for f in files:
-                        yield (os.path.join(root, f), rel_path)
+        jobs = self._parse_jobs(parts)
+        if jobs is None:
+            print("[ERROR] Usage: mput [-j N] <pattern>")
+            return
 
         for part in parts:
             matches = glob.glob(part, recursive=True)
             for match in matches:
-                for local_path, rel_path in collect_files(match):
+                for local_path, rel_path in self._collect_files(match):
                     norm = os.path.normpath(local_path)
                     if norm in uploaded:
                         continue
                     uploaded.add(norm)
+                    if self._uploaded_before(local_path, rel_path):
+                        print(f"[INFO] Skipping {local_path}: already uploaded")
+                        continue
                     if self.prompt:
                         ans = input(f"Upload {local_path}? (y/n): ")
                         if ans.lower() != 'y':
                             continue
-                    self.put(local_path, rel_path)
+                    selected.append((local_path, rel_path))
+
+        self._upload_files(selected, jobs)
+
+    @staticmethod
+    def _collect_files(path, base_dir=""):
+        """Yields (local_path, remote_rel_path) for a file, or for every file under a directory.
+
+        Files under a directory keep the directory's own name in their
+        remote path ("docs/a.txt" for the folder "docs").
+        """
+        if os.path.isfile(path):
+            yield (path, base_dir)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                rel_path = os.path.relpath(root, base_dir or os.path.dirname(path))
+                for f in files:
+                    yield (os.path.join(root, f), rel_path)
+
+    def _upload_files(self, files, jobs=1):
+        """Scans and uploads files over parallel sessions, the scan pipeline, or one by one.
+
+        Args:
+            files (list): (local_path, remote_rel_path) tuples.
+            jobs (int): Number of parallel sessions ("-j N").
+        """
+        if jobs > 1 and len(files) > 1:
+            files = self._parallel_upload(files, jobs)
+        if len(files) > 1 and self.pipeline_depth > 0:
+            self._pipelined_upload(files)
+        else:
+            for local_path, rel_path in files:
+                self.put(local_path, rel_path)
+
+    def sync(self, args):
+        """Uploads only the files of a local folder that are new or changed on the server.
+
+        Every remote folder is listed once (MLSD when available, LIST
+        otherwise). A file is skipped when the server has a file of the same
+        size and either the transfer journal shows this exact version (same
+        mtime, or same SHA-256) was uploaded there, or the server's
+        modification time is not older than the local one. Everything else
+        goes through the normal scan-then-upload path of mput.
+
+        Args:
+            args (str): "[-j N] <local_dir> [remote_dir]".
+        """
+        parts = args.strip().split()
+        jobs = self._parse_jobs(parts)
+        if jobs is None or len(parts) not in (1, 2) or not os.path.isdir(parts[0]):
+            print("[ERROR] Usage: sync [-j N] <local_dir> [remote_dir]")
+            return
+        local_dir = parts[0].rstrip('/\\') or parts[0]
+        remote_root = parts[1] if len(parts) == 2 else ""
+
+        listings = {}
+
+        def remote_entries(remote_dir):
+            # Tên -> RemoteEntry của một thư mục remote, None nếu thư mục chưa tồn tại.
+            # Thư mục cha được liệt kê trước, nên thư mục con chưa có sẽ không bị LIST (tránh lỗi 550).
+            if remote_dir not in listings:
+                parent, name = posixpath.split(remote_dir)
+                entries = None
+                parent_entries = remote_entries(parent) if name else None
+                if not name or (parent_entries is not None and name in parent_entries
+                                and parent_entries[name].is_dir):
+                    found = self.list_dir(remote_dir, fresh=True)
+                    if found is not None:
+                        entries = {entry.name: entry for entry in found}
+                listings[remote_dir] = entries
+            return listings[remote_dir]
+
+        selected = []
+        total = 0
+        for local_path, rel_path in self._collect_files(local_dir):
+            total += 1
+            rel_path = rel_path.replace('\\', '/')
+            remote_dir = posixpath.join(remote_root, rel_path) if remote_root else rel_path
+            # "sync ." cho rel_path "." (và "rdir/."): chuẩn hóa để tra đúng listing của thư mục
+            remote_dir = posixpath.normpath(remote_dir) if remote_dir else ""
+            if remote_dir == '.':
+                remote_dir = ""
+            entries = remote_entries(remote_dir)
+            name = os.path.basename(local_path)
+            entry = entries.get(name) if entries else None
+            if not self._needs_upload(local_path, posixpath.join(remote_dir, name), entry):
+                continue
+            if self.prompt:
+                ans = input(f"Upload {local_path}? (y/n): ")
+                if ans.lower() != 'y':
+                    continue
+            selected.append((local_path, remote_dir))
+
+        print(f"[sync] {len(selected)} of {total} files are new or changed.")
+        self._upload_files(selected, jobs)
+
+    def _needs_upload(self, local_path, remote_path, entry):
+        """Decides whether sync must upload a local file.
+
+        The journal's SHA-256 of the last upload decides when it exists;
+        modification times are only compared when no digest was recorded.
+
+        Args:
+            local_path (str): The local file.
+            remote_path (str): Where it would be stored on the server.
+            entry (RemoteEntry|None): The server's entry for remote_path, if it exists.
+
+        Returns:
+            bool: True if the file is missing or different on the server.
+        """
+        if entry is None or entry.is_dir:
+            return True
+        stat = os.stat(local_path)
+        if entry.size is not None and entry.size != stat.st_size:
+            return True
+
+        if self.journal:
+            server, abs_path = self._server_id(), self._abs_remote(remote_path)
+            row = self.journal.lookup_upload(server, abs_path)
+            if row and row[0] == stat.st_size:
+                if row[1] == stat.st_mtime_ns:
+                    return False
+                if row[2]:
+                    # File bị "touch" nhưng nội dung không đổi: không cần quét và upload lại.
+                    # Nội dung khác thì phải upload, kể cả khi mtime cũ hơn (cp -p, tar, rsync -t)
+                    sha256 = file_sha256(local_path)
+                    if sha256 != row[2]:
+                        return True
+                    self.journal.record_upload(server, abs_path, stat.st_size, stat.st_mtime_ns, sha256)
+                    return False
+
+        # MLSD modify là giờ UTC dạng YYYYMMDDHHMMSS
+        remote_mtime = parse_mlsx_time(entry.modify)
+        if remote_mtime is not None and entry.size is not None:
+            return int(stat.st_mtime) > remote_mtime
+        return True
+
+    def _uploaded_before(self, local_path, remote_rel_path):
+        """Tells whether mput can skip a file that an earlier run already uploaded.
+
+        Args:
+            local_path (str): The local file.
+            remote_rel_path (str): Relative remote folder it is uploaded to.
+
+        Returns:
+            bool: True if the journal has this size and mtime for the remote
+            path and the server's copy still has that size.
+        """
+        if not self.journal:
+            return False
+        remote_path = os.path.join(remote_rel_path, os.path.basename(local_path)).replace('\\', '/')
+        stat = os.stat(local_path)
+        row = self.journal.lookup_upload(self._server_id(), self._abs_remote(remote_path))
+        if row is None or row[:2] != (stat.st_size, stat.st_mtime_ns):
+            return False
+        # Journal chỉ ghi upload đã hoàn tất; vẫn hỏi SIZE phòng khi file trên server đã bị xóa hoặc ghi đè
+        return self.remote_size(remote_path) == stat.st_size
+
+    def _downloaded_before(self, remote_path, local_path, size):
+        """Tells whether mget can skip a file whose local copy is already complete.
+
+        Args:
+            remote_path (str): The remote file.
+            local_path (str): Where it would be saved.
+            size (int|None): The remote size from the listing, if known.
+
+        Returns:
+            bool: True in binary mode when the local file has the remote size
+            and no interrupted download of it is in the journal.
+        """
+        if self.transfer_mode != 'binary' or not os.path.isfile(local_path):
+            return False
+        if self.journal and self.journal.lookup_partial(
+                self._server_id(), 'get', self._abs_remote(remote_path), os.path.abspath(local_path)):
+            return False
+        if size is None:
+            size = self.remote_size(remote_path)
+        return size is not None and os.path.getsize(local_path) == size
+
+    def remote_hash(self, path):
+        """Asks the server for a checksum of a remote file.
+
+        Uses HASH (with the server's current algorithm) when announced in
+        FEAT, otherwise one of the older XSHA256/XSHA1/XMD5/XCRC commands.
+
+        Args:
+            path (str): Remote file.
+
+        Returns:
+            tuple|None: (algorithm, hex digest), with a name accepted by file_digest(), or None.
+        """
+        algorithms = {'SHA-256': 'sha256', 'SHA-512': 'sha512', 'SHA-1': 'sha1', 'MD5': 'md5', 'CRC32': 'crc32'}
+        if self.has_feature("HASH"):
+            # Server dùng thuật toán đang chọn (FEAT: " HASH SHA-256*;SHA-1;MD5", dấu * là thuật toán hiện tại)
+            self._send_cmd(f"HASH {path}")
+            resp = self._recv_response_blocking()
+            # 213 SHA-256 0-49 <hex> <path>
+            fields = resp.split()
+            if resp.startswith("213") and len(fields) >= 4 and fields[1] in algorithms:
+                return algorithms[fields[1]], fields[3].lower()
+            debug_logger.debug(f"HASH failed: {resp}")
+            return None
+        for command, algorithm in (('XSHA256', 'sha256'), ('XSHA1', 'sha1'), ('XMD5', 'md5'), ('XCRC', 'crc32')):
+            if self.has_feature(command):
+                self._send_cmd(f"{command} {path}")
+                resp = self._recv_response_blocking()
+                # 250 <hex> (một số server trả về 213)
+                fields = resp.split()
+                if resp.startswith(("250", "213")) and len(fields) >= 2 \
+                        and re.fullmatch(r'[0-9A-Fa-f]+', fields[-1]):
+                    return algorithm, fields[-1].lower()
+                return None
+        return None
+
+    def _needs_download(self, remote_path, local_path, entry):
+        """Decides whether mirror must download a remote file.
+
+        Args:
+            remote_path (str): The remote file.
+            local_path (str): Where the local copy is kept.
+            entry (RemoteEntry): The remote file's listing entry.
+
+        Returns:
+            bool: True if the local copy is missing or different.
+        """
+        if not os.path.isfile(local_path):
+            return True
+        if self.journal and self.journal.lookup_partial(
+                self._server_id(), 'get', self._abs_remote(remote_path), os.path.abspath(local_path)):
+            # Lần tải trước bị ngắt giữa chừng: get sẽ tải tiếp phần còn thiếu
+            return True
+        stat = os.stat(local_path)
+        if entry.size is not None and entry.size != stat.st_size:
+            return True
+        # mirror đặt mtime của bản local bằng modify của server, nên bằng nhau nghĩa là không đổi
+        remote_mtime = parse_mlsx_time(entry.modify)
+        if remote_mtime is not None and int(stat.st_mtime) == remote_mtime:
+            return False
+        digest = self.remote_hash(remote_path)
+        if digest is not None:
+            algorithm, value = digest
+            return file_digest(local_path, algorithm) != value
+        # Không có thời gian lẫn checksum (LIST thuần): chỉ so sánh được kích thước
+        return remote_mtime is not None
+
+    def mirror(self, args):
+        """Downloads only the remote files that are missing or different locally.
+
+        A local copy is kept when its size matches and its mtime equals the
+        server's MLSD modify time (mirror sets it after each download), or
+        the server's checksum (HASH/XSHA256/XSHA1/XMD5/XCRC) matches the local
+        file. Without modify times or checksums only sizes are compared.
+
+        With "--delete", local files under the target folder that no longer
+        exist on the server are removed (only when every remote folder could
+        be listed).
+
+        Args:
+            args (str): "[-j N] [--delete] <remote_dir> [local_dir]".
+        """
+        parts = args.strip().split()
+        jobs = self._parse_jobs(parts)
+        delete = '--delete' in parts
+        if delete:
+            parts.remove('--delete')
+        if jobs is None or len(parts) not in (1, 2):
+            print("[ERROR] Usage: mirror [-j N] [--delete] <remote_dir> [local_dir]")
+            return
+        remote_root = parts[0].rstrip('/') or parts[0]
+        local_root = parts[1] if len(parts) == 2 else (posixpath.basename(remote_root) or '.')
+
+        fetch_file = self.get
+        downloader = None
+        if jobs > 1:
+            downloader = ParallelDownloader(self, jobs)
+            fetch_file = downloader.submit
+
+        expected = set()
+        complete = True
+        total = 0
+        changed = 0
+        try:
+            pending = [(remote_root, local_root)]
+            while pending:
+                remote_dir, local_dir = pending.pop()
+                entries = self.list_dir(remote_dir, fresh=True)
+                if entries is None:
+                    complete = False
+                    continue
+                os.makedirs(local_dir, exist_ok=True)
+                expected.add(os.path.normpath(local_dir))
+                for entry in entries:
+                    remote_item = f"{remote_dir}/{entry.name}".replace("//", "/")
+                    local_item = os.path.join(local_dir, entry.name)
+                    if entry.is_dir:
+                        self.known_dirs.add(self._abs_remote(remote_item))
+                        pending.append((remote_item, local_item))
+                        continue
+                    total += 1
+                    expected.add(os.path.normpath(local_item))
+                    if not self._needs_download(remote_item, local_item, entry):
+                        continue
+                    if self.prompt:
+                        ans = input(f"Download file {remote_item}? (y/n): ")
+                        if ans.lower() != 'y':
+                            continue
+                    changed += 1
+                    fetch_file(remote_item, local_item, mtime=parse_mlsx_time(entry.modify), size=entry.size)
+        finally:
+            if downloader:
+                downloader.finish()
+        print(f"[mirror] {changed} of {total} remote files were new or changed.")
+
+        if not delete:
+            return
+        if not complete:
+            print("[WARN] Some remote folders could not be listed, no local files deleted.")
+            return
+        for root, dirs, files in os.walk(local_root, topdown=False):
+            for f in files:
+                local_item = os.path.join(root, f)
+                if os.path.normpath(local_item) in expected:
+                    continue
+                if self.prompt:
+                    ans = input(f"Delete local file {local_item}? (y/n): ")
+                    if ans.lower() != 'y':
+                        continue
+                os.remove(local_item)
+                print(f"[mirror] Deleted local {local_item}")
+            for d in dirs:
+                local_item = os.path.join(root, d)
+                if os.path.normpath(local_item) not in expected and not os.listdir(local_item):
+                    os.rmdir(local_item)
+
+    @staticmethod
+    def _parse_jobs(parts):
+        """Removes a "-j N" option from an argument list.
+
+        Args:
+            parts (list): Command arguments; modified in place.
+
+        Returns:
+            int|None: N (1 if the option is absent), or None if N is invalid.
+        """
+        if '-j' not in parts:
+            return 1
+        idx = parts.index('-j')
+        try:
+            jobs = int(parts[idx + 1])
+        except (IndexError, ValueError):
+            return None
+        del parts[idx:idx + 2]
+        return jobs if jobs > 0 else None
+
+    def _parallel_upload(self, files, jobs):
+        """Scans and uploads files over `jobs` parallel FTP sessions.
+
+        Each worker thread owns one session from an FTPSessionPool and takes
+        files from a shared queue: scan, then upload if the result is OK.
+
+        Args:
+            files (list): (local_path, remote_rel_path) tuples.
+            jobs (int): Number of parallel sessions.
+
+        Returns:
+            list: Files that were not handled because no session could be opened.
+        """
+        work = queue.Queue()
+        for item in files:
+            work.put(item)
+        stop = threading.Event()
+
+        def worker(pool):
+            try:
+                session = pool.acquire()
+            except Exception as e:
+                print(f"[ERROR] Could not open a parallel session: {e}")
+                return
+            try:
+                while not stop.is_set():
+                    try:
+                        local_path, rel_path = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    if os.path.isfile(local_path):
+                        result = session.scan_with_clamav(local_path, quiet=True)
+                    else:
+                        result = f"ERROR: File '{local_path}' does not exist."
+                    # Một lần write cho cả dòng để output của các luồng không bị trộn giữa dòng
+                    sys.stdout.write(f"[SCAN] {local_path}: {result}\n")
+                    if result != "OK":
+                        sys.stdout.write(f"[WARNING] Upload aborted. Scan result: {result}\n")
+                        continue
+                    session._store_file(local_path, rel_path, quiet=True)
+            finally:
+                pool.release(session)
+
+        with FTPSessionPool(self, jobs) as pool:
+            threads = [threading.Thread(target=worker, args=(pool,), daemon=True)
+                       for _ in range(min(jobs, len(files)))]
+            for t in threads:
+                t.start()
+            try:
+                for t in threads:
+                    t.join()
+            finally:
+                stop.set()
+
+        # File còn lại (không mở được session nào) sẽ được upload bằng session chính
+        remaining = []
+        while not work.empty():
+            remaining.append(work.get_nowait())
+        return remaining
+
+    def _pipelined_upload(self, files):
+        """Uploads files while the next ones are scanned in a background thread.
 
+        Scan results wait in a queue of at most `pipeline_depth` files; only
+        files whose result is OK are uploaded.
+
+        Args:
+            files (list): (local_path, remote_rel_path) tuples, in upload order.
+        """
+        results = queue.Queue(maxsize=self.pipeline_depth)
+        stop = threading.Event()
+
+        def scan_stage():
+            for local_path, rel_path in files:
+                if stop.is_set():
+                    break
+                if os.path.isfile(local_path):
+                    result = self.scan_with_clamav(local_path, quiet=True)
+                else:
+                    result = f"ERROR: File '{local_path}' does not exist."
+                # Chặn lại khi đã có đủ pipeline_depth file quét xong mà chưa upload
+                results.put((local_path, rel_path, result))
+            results.put(None)
+
+        scanner = threading.Thread(target=scan_stage, daemon=True)
+        scanner.start()
+        try:
+            while True:
+                item = results.get()
+                if item is None:
+                    break
+                local_path, rel_path, result = item
+                print(f"[SCAN] {local_path}: {result}")
+                if result != "OK":
+                    print(f"[WARNING] Upload aborted. Scan result: {result}")
+                    continue
+                self._store_file(local_path, rel_path)
+        finally:
+            # Dừng luồng quét (ví dụ khi người dùng nhấn Ctrl+C) và giải phóng hàng đợi
+            stop.set()
+            while scanner.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
 
     def mget(self, args):
         """Downloads multiple files matching a pattern or directory.
 
+        With "-j N", the main session only walks the remote tree and queues
+        the files it finds; N parallel sessions download them meanwhile.
+
+        In binary mode, files whose local copy already has the remote size
+        (and no interrupted download in the journal) are skipped, so running
+        an interrupted mget again only fetches what is left.
+
         Args:
-            args (str): Remote file pattern or directory.
+            args (str): Remote file pattern or directory, optionally with "-j N".
         """
         parts = args.strip().split()
         dest_dir = "."
 
+        jobs = self._parse_jobs(parts)
+        if jobs is None:
+            print("[ERROR] Usage: mget [-j N] <pattern> [dest]")
+            return
+
         if parts and os.path.isdir(parts[-1]):
             dest_dir = parts[-1]
             parts = parts[:-1]
 
+        # Tải tuần tự bằng session chính, hoặc đưa vào hàng đợi cho các session song song
+        download = self.get
+        downloader = None
+        if jobs > 1:
+            downloader = ParallelDownloader(self, jobs)
+            download = downloader.submit
+
+        def fetch_file(remote_path, local_path, size=None):
+            # Lần mget trước đã tải xong file này: không tải lại
+            if self._downloaded_before(remote_path, local_path, size):
+                print(f"[INFO] Skipping {remote_path}: already downloaded")
+                return
+            download(remote_path, local_path, size=size)
+
+        home = self.remote_cwd()
+
         def is_directory(remote_path):
-            self._send_cmd(f"CWD {remote_path}")
-            resp = self._recv_response_blocking()
-            if resp.startswith("250"):
-                self._send_cmd("CDUP")
-                self._recv_response_blocking()
+            # Thư mục đã biết (known_dirs) thì không cần hỏi server.
+            abs_path = self._abs_remote(remote_path)
+            if abs_path in self.known_dirs:
+                return True
+            # Server hỗ trợ MLST: một lệnh cho biết luôn kiểu của remote_path, không cần thử CWD.
+            if self.has_feature("MLST"):
+                entry = self.stat_remote(remote_path)
+                if entry is not None and entry.is_dir:
+                    self.known_dirs.add(abs_path)
+                    return True
+                return False
+            # CWD vào thử rồi quay về thư mục ban đầu (đường dẫn tuyệt đối), gửi chung một lần.
+            # Quay về bằng CWD <home> thay vì CDUP nên đúng cả khi remote_path có nhiều cấp.
+            if not home:
+                self._send_cmd(f"CWD {remote_path}")
+                resp = self._recv_response_blocking()
+                if resp.startswith("250"):
+                    self._send_cmd("CDUP")
+                    self._recv_response_blocking()
+                    self.known_dirs.add(abs_path)
+                    return True
+                return False
+            replies = self._send_pipelined([f"CWD {remote_path}", f"CWD {home}"])
+            if replies[0].code == 250:
+                self.known_dirs.add(abs_path)
                 return True
             return False
 
-        def parse_listing(listing):
-            entries = []
-            for line in listing.decode().splitlines():
-                parts = line.split()
-                if len(parts) < 9:
-                    continue
-                name = parts[-1]
-                type_char = parts[0][0]
-                entries.append((name, type_char == 'd'))
-            return entries
-
         def recursive_download(remote_path, local_path):
             os.makedirs(local_path, exist_ok=True)
 
-            if self.passive_mode:
-                data_sock = self._open_data_connection()
-                self._send_cmd(f"LIST {remote_path}")
-                resp = self._recv_response_blocking()
-                if not resp.startswith("150"):
-                    print(f"[ERROR] {resp}")
-                    return
-            else:
-                self._open_data_connection()
-                self._send_cmd(f"LIST {remote_path}")
-                resp = self._recv_response_blocking()
-                if not resp.startswith("150"):
-                    print(f"[ERROR] {resp}")
-                    return
-                try:
-                    data_sock, _ = self.active_data_listener.accept()
-                except socket.timeout:
-                    print("[ERROR] Timeout waiting for server to connect in active mode.")
-                    self.active_data_listener.close()
-                    self.active_data_listener = None
-                    return
-                self.active_data_listener.close()
-                self.active_data_listener = None
-
-            listing = b""
-            while True:
-                chunk = data_sock.recv(BUFFER_SIZE)
-                if not chunk:
-                    break
-                listing += chunk
-            data_sock.close()
-            self._recv_response_blocking()
+            # Kiểu của từng mục có sẵn trong listing (MLSD hoặc LIST), không cần CWD thử từng mục
+            entries = self.list_dir(remote_path)
+            if entries is None:
+                return
 
-            for name, is_dir in parse_listing(listing):
+            for entry in entries:
+                name = entry.name
                 remote_item = f"{remote_path}/{name}".replace("//", "/")
                 local_item = os.path.join(local_path, name)
-                if is_dir:
+                if entry.is_dir:
+                    self.known_dirs.add(self._abs_remote(remote_item))
                     if self.prompt:
                         ans = input(f"Download directory {remote_item}? (y/n): ")
                         if ans.lower() != 'y':
@@ -789,60 +2945,50 @@ class RawFTPClient:
                         ans = input(f"Download file {remote_item}? (y/n): ")
                         if ans.lower() != 'y':
                             continue
-                    self.get(remote_item, local_item)
+                    fetch_file(remote_item, local_item, size=entry.size)
 
-        def match_remote_files(pattern):
-            data_sock = self._open_data_connection()
-            self._send_cmd("LIST")
-            resp = self._recv_response_blocking()
-            if not resp.startswith("150"):
-                print(f"[ERROR] {resp}")
+        def match_remote_files(pattern, prefix=""):
+            entries = self.list_dir(prefix)
+            if entries is None:
                 return []
-            listing = b""
-            while True:
-                chunk = data_sock.recv(BUFFER_SIZE)
-                if not chunk:
-                    break
-                listing += chunk
-            data_sock.close()
-            self._recv_response_blocking()
-
-            matched = []
-            for name, is_dir in parse_listing(listing):
-                if fnmatch.fnmatch(name, pattern):
-                    matched.append((name, is_dir))
-            return matched
-
-        for target in parts:
-            if "*" in target or "?" in target:
-                matched_files = match_remote_files(os.path.basename(target))
-                prefix = os.path.dirname(target)
-                for name, is_dir in matched_files:
-                    remote_path = f"{prefix}/{name}" if prefix else name
-                    local_path = os.path.join(dest_dir, name)
-                    if is_dir:
-                        if self.prompt:
-                            ans = input(f"Download directory {remote_path}? (y/n): ")
-                            if ans.lower() != 'y':
-                                continue
-                        recursive_download(remote_path, os.path.join(dest_dir, name))
+            return [entry for entry in entries if fnmatch.fnmatch(entry.name, pattern)]
+
+        try:
+            for target in parts:
+                if "*" in target or "?" in target:
+                    prefix = os.path.dirname(target)
+                    matched_files = match_remote_files(os.path.basename(target), prefix)
+                    for entry in matched_files:
+                        name = entry.name
+                        remote_path = f"{prefix}/{name}" if prefix else name
+                        local_path = os.path.join(dest_dir, name)
+                        if entry.is_dir:
+                            self.known_dirs.add(self._abs_remote(remote_path))
+                            if self.prompt:
+                                ans = input(f"Download directory {remote_path}? (y/n): ")
+                                if ans.lower() != 'y':
+                                    continue
+                            recursive_download(remote_path, os.path.join(dest_dir, name))
+                        else:
+                            if self.prompt:
+                                ans = input(f"Download file {remote_path}? (y/n): ")
+                                if ans.lower() != 'y':
+                                    continue
+                            fetch_file(remote_path, local_path, size=entry.size)
+                else:
+                    if is_directory(target):
+                        local_target_dir = os.path.join(dest_dir, os.path.basename(target))
+                        recursive_download(target, local_target_dir)
                     else:
+                        local_file = os.path.join(dest_dir, os.path.basename(target))
                         if self.prompt:
-                            ans = input(f"Download file {remote_path}? (y/n): ")
+                            ans = input(f"Download file {target}? (y/n): ")
                             if ans.lower() != 'y':
                                 continue
-                        self.get(remote_path, local_path)
-            else:
-                if is_directory(target):
-                    local_target_dir = os.path.join(dest_dir, os.path.basename(target))
-                    recursive_download(target, local_target_dir)
-                else:
-                    local_file = os.path.join(dest_dir, os.path.basename(target))
-                    if self.prompt:
-                        ans = input(f"Download file {target}? (y/n): ")
-                        if ans.lower() != 'y':
-                            continue
-                    self.get(target, local_file)
+                        fetch_file(target, local_file)
+        finally:
+            if downloader:
+                downloader.finish()
 
     def _spinner_animation(self, stop_event):
         """
@@ -862,11 +3008,112 @@ class RawFTPClient:
         sys.stdout.write(' \b')
         sys.stdout.flush()
 
-    def scan_with_clamav(self, filepath):
+    def _connect_clamav_agent(self, metadata, digest=None):
+        """Connects to the ClamAV agent and sends the file metadata.
+
+        If `digest` is given, the agent is first asked for a cached verdict
+        with "HASH <sha256> <size>". A known file is answered with OK or
+        INFECTED right away, so its bytes never have to be sent; otherwise
+        the agent answers UNKNOWN and the normal metadata exchange follows
+        on the same connection.
+
+        If the agent answers "BUSY: retry after N", waits N seconds and tries
+        again, up to CLAMAV_BUSY_RETRIES times.
+
+        Args:
+            metadata (str): The "filename:filesize" metadata string.
+            digest (tuple|None): (sha256 hex digest, file size) of the file.
+
+        Returns:
+            tuple: (socket, None) with META_OK received and the socket ready for
+                the file data, or (None, verdict) if the agent knew the file.
+
+        Raises:
+            Exception: If the agent stays busy or does not acknowledge the metadata.
+        """
+        attempt = 0
+        while True:
+            # Tạo TCP socket và kết nối đến địa chỉ của ClamAV agent.
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._tune_socket(s)
+            try:
+                s.connect((self.clamav_host, self.clamav_port))
+                ack = b"UNKNOWN"
+                if digest and self.clamav_hash_probe:
+                    # Hỏi agent trước bằng hash, chưa gửi dữ liệu file
+                    s.sendall(f"HASH {digest[0]} {digest[1]}".encode())
+                    ack = s.recv(1024)
+                    if ack in (b"OK", b"INFECTED"):
+                        s.close()
+                        return None, ack.decode()
+                    if not ack:
+                        # Agent cũ không hiểu HASH và đóng kết nối: thử lại không dùng HASH
+                        self.clamav_hash_probe = False
+                        s.close()
+                        continue
+                if ack == b"UNKNOWN":
+                    # Gửi metadata đến ClamAV agent
+                    s.sendall(metadata.encode())
+                    # Chờ nhận xác nhận (acknowledgement) từ agent.
+                    # Đọc tối đa 1024 byte dữ liệu từ socket, ack thường nhỏ hơn rất nhiều
+                    ack = s.recv(1024)
+            except Exception:
+                s.close()
+                raise
+            if ack == b"META_OK":
+                return s, None
+            s.close()
+
+            busy = re.match(rb"BUSY.*?(\d+)", ack)
+            # Nếu agent không acknowledge metadata
+            if not busy:
+                raise Exception("ClamAVAgent did not acknowledge metadata.")
+            if attempt == CLAMAV_BUSY_RETRIES:
+                raise Exception("ClamAVAgent is busy. Please try again later.")
+            attempt += 1
+            retry_after = int(busy.group(1))
+            print(f"[INFO] ClamAV agent is busy, retrying in {retry_after}s...")
+            time.sleep(retry_after)
+
+    def _agent_signature_version(self):
+        """Returns the agent's signature version (cached for AGENT_VERSION_TTL seconds).
+
+        Returns:
+            str|None: The version, or None if the agent cannot tell (the local
+            scan cache is then skipped).
+        """
+        if self.agent_version and time.time() - self.agent_version[1] < AGENT_VERSION_TTL:
+            return self.agent_version[0]
+        version = None
+        try:
+            with socket.create_connection((self.clamav_host, self.clamav_port), timeout=10) as s:
+                s.sendall(b"VERSION")
+                reply = s.recv(1024).decode()
+            if reply and reply != "UNKNOWN" and not reply.startswith(("BUSY", "ERROR")):
+                version = reply
+        except (OSError, UnicodeDecodeError) as e:
+            debug_logger.debug(f"Could not get agent signature version: {e}")
+        self.agent_version = (version, time.time())
+        return version
+
+    def _print_scan_result(self, result):
+        """Explains a scan result string to the user."""
+        if result == "OK":
+            print(f"Result OK: The file is safe.")
+        elif result == "INFECTED":
+            print(f"Result INFECTED: The file contains virus.")
+        elif result.startswith("ERROR"):
+            print(f"Result ERROR: {result}")
+        else:
+            print(f"Result UNKNOWN: {result}")
+
+    def scan_with_clamav(self, filepath, quiet=False):
         """Scans a file with ClamAV before upload.
 
         Args:
             filepath (str): Path to the local file.
+            quiet (bool): If True, print nothing (no progress bar, spinner or result
+                explanation). Used when scanning runs in the background.
 
         Returns:
             str: Scan result string.
@@ -887,84 +3134,88 @@ class RawFTPClient:
         stop_spinner = threading.Event()
 
         try:
-            # --- Step 3: Connect to ClamAV agent and send metadata ---
+            # --- Step 3: Local scan cache ---
+            # File không đổi (path, size, mtime) hoặc có cùng SHA-256 với file đã quét
+            # dưới cùng phiên bản signature thì dùng lại kết quả, không cần hỏi agent.
+            stat = os.stat(filepath)
+            abs_path = os.path.abspath(filepath)
+            version = self._agent_signature_version() if self.scan_cache else None
+            cached_result = None
+            if version:
+                row = self.scan_cache.lookup(abs_path, stat.st_size, stat.st_mtime_ns, version)
+                if row:
+                    cached_result, sha256 = row
+            if not cached_result:
+                sha256 = file_sha256(filepath)
+                if version:
+                    cached_result = self.scan_cache.lookup_hash(sha256, version)
+            # _store_file dùng lại hash này cho transfer journal, không phải đọc file thêm lần nữa
+            self.scan_digests[abs_path] = (stat.st_size, stat.st_mtime_ns, sha256)
+            if cached_result:
+                self.scan_cache.store(abs_path, stat.st_size, stat.st_mtime_ns, sha256, version, cached_result)
+                if not quiet:
+                    print(f"'{os.path.basename(filepath)}' was already scanned (local scan cache).")
+                    self._print_scan_result(cached_result)
+                return cached_result
+
+            # --- Step 4: Connect to ClamAV agent and send metadata ---
             # Lấy metadata để gửi qua ClamAV agent
-            filesize = os.path.getsize(filepath)
+            filesize = stat.st_size
             metadata = f"{os.path.basename(filepath)}:{filesize}"
             
-            # Tạo TCP socket và kết nối đến địa chỉ của ClamAV agent.
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((self.clamav_host, self.clamav_port))
-            # Gửi metadata đến ClamAV agent
-            s.sendall(metadata.encode())
-            
-            # Chờ nhận xác nhận (acknowledgement) từ agent.
-            # Đọc tối đa 1024 byte dữ liệu từ socket, ack thường nhỏ hơn rất nhiều
-            ack = s.recv(1024)
-            # Nếu agent không acknowledge metadata
-            if ack != b"META_OK":
-                s.close()
-                return "ERROR: ClamAVAgent did not acknowledge metadata."
-            
-            # --- Step 4 (Phase 1): Send file data with a progress bar ---
+            # Kết nối đến ClamAV agent, gửi metadata và chờ META_OK (thử lại nếu agent BUSY).
+            # Nếu agent đã quét file có cùng SHA-256 thì nhận kết quả luôn, không cần gửi file.
+            s, cached_result = self._connect_clamav_agent(metadata, (sha256, filesize))
+            if cached_result:
+                if version:
+                    self.scan_cache.store(abs_path, stat.st_size, stat.st_mtime_ns, sha256, version, cached_result)
+                if not quiet:
+                    print(f"ClamAV agent already knows '{os.path.basename(filepath)}' (same SHA-256), file not sent.")
+                    self._print_scan_result(cached_result)
+                return cached_result
+
+            # --- Step 5 (Phase 1): Send file data with a progress bar ---
+            # Progress bar được vẽ bởi luồng riêng của TransferProgress; vòng lặp gửi không sleep, không in gì.
             bytes_sent = 0
-            progress_bar_length = 50
-            
-            # Thông báo bắt đầu gửi file tới ClamAV
+            sizer = self._chunk_sizer()
             send_pretext = f"Sending to ClamAV: '{os.path.basename(filepath)}':"
-            sys.stdout.write(send_pretext)
-            sys.stdout.flush()
-
-            # Mở file ở chế độ đọc nhị phân.
-            with open(filepath, 'rb') as f:
-                while True:
-                    # Đọc BUFFER_SIZE data đến khi đủ file
-                    data = f.read(BUFFER_SIZE)
-                    if not data:
+            with open(filepath, 'rb') as f, self._progress(send_pretext, filesize, quiet) as progress:
+                while bytes_sent < filesize:
+                    # sendfile: kernel gửi thẳng từ file ra socket. Không gửi quá filesize đã báo cho agent
+                    # (file có thể lớn lên trong lúc gửi); khi có progress bar thì gửi từng đoạn sizer.size.
+                    remaining = filesize - bytes_sent
+                    count = min(sizer.size, remaining) if progress.enabled else remaining
+                    sent = s.sendfile(f, bytes_sent, count)
+                    if not sent:
                         break
-                    s.sendall(data)
-                    bytes_sent += len(data)
-
-                    # Tính toán và hiển thị thanh progress.
-                    percent_complete = (bytes_sent / filesize) * 100
-                    filled_length = int(progress_bar_length * bytes_sent // filesize)
-                    bar = '█' * filled_length + '-' * (progress_bar_length - filled_length)
-                    progress_string = f'\r{send_pretext} |{bar}| {percent_complete:.2f}%'
-                    sys.stdout.write(progress_string)
-                    sys.stdout.flush()
-                    
-                    # Add a small delay to visualize the progress
-                    time.sleep(0.01)
-                    
-            # --- Step 5 (Phase 2): Wait for scan result with a spinner animation ---
-            # Sau khi gửi file xong, xuống dòng để bắt đầu hiển thị spinner.
-            sys.stdout.write('\n')
-            # Tạo một luồng mới, chạy hàm `_spinner_animation`.
-            spinner_thread = threading.Thread(target=self._spinner_animation, args=(stop_spinner,))
-            sys.stdout.write("Waiting for scan result: ")
-            spinner_thread.start()
+                    bytes_sent += sent
+                    sizer.record(sent)
+                    progress.update(sent)
+
+            # --- Step 6 (Phase 2): Wait for scan result with a spinner animation ---
+            if not quiet:
+                # Tạo một luồng mới, chạy hàm `_spinner_animation`.
+                spinner_thread = threading.Thread(target=self._spinner_animation, args=(stop_spinner,))
+                sys.stdout.write("Waiting for scan result: ")
+                spinner_thread.start()
 
             # The main thread blocks here, waiting for the server's response
             # The spinner thread continues to run in the background
             result = s.recv(1024).decode()
             
-            # --- Step 6: Stop spinner and process the result ---
+            # --- Step 7: Stop spinner and process the result ---
             # Stop the spinner and print "Done" on the same line.
-            if spinner_thread.is_alive():
+            if spinner_thread and spinner_thread.is_alive():
                 stop_spinner.set()
                 spinner_thread.join()
                 sys.stdout.write("Done\n")
                 sys.stdout.flush()
             
             # Explain the result to the user
-            if result == "OK":
-                print(f"Result OK: The file is safe.")
-            elif result == "INFECTED":
-                print(f"Result INFECTED: The file contains virus.")
-            elif result.startswith("ERROR"):
-                print(f"Result ERROR: {result}")
-            else:
-                print(f"Result UNKNOWN: {result}")
+            if not quiet:
+                self._print_scan_result(result)
+            if version:
+                self.scan_cache.store(abs_path, stat.st_size, stat.st_mtime_ns, sha256, version, result)
 
             return result
         except Exception as e:
@@ -995,17 +3246,22 @@ Supported Commands:
   ascii                     Set ASCII mode
   binary                    Set binary mode
   prompt                    Toggle prompt for mput/mget
+  progress                  Toggle progress bars for get/put/scan
+  buffer [auto|fixed|<kb> [sock_kb]]  Show or set transfer chunk/socket buffer sizes
   ls                        List files on server
   cd <dir>                  Change server directory
   pwd                       Print working directory
   mkdir <name>              Create server directory
   rmdir <name>              Remove server directory
   delete <file>             Delete file on server
+  mdelete <file> [file...]  Delete several files on server
   rename <from> <to>        Rename file on server
   get, recv <file> [dest]         Download file
-  mget <pattern> [dest]     Download multiple files
+  mget [-j N] <pattern> [dest]  Download multiple files, N parallel sessions
+  mirror [-j N] [--delete] <rdir> [dir]  Download only new or changed files of a folder
   put <file>                Upload file (scan first)
-  mput <pattern>            Upload multiple files (scan all)
+  mput [-j N] <pattern>     Upload multiple files (scan all), N parallel sessions
+  sync [-j N] <dir> [rdir]  Upload only new or changed files of a folder (scan all)
   help, ?                   Show this help
   quit, bye                 Exit the client
   testmode on/off           Set test mode: on-local/off-remote
@@ -1061,8 +3317,12 @@ def main():
                 client.set_ascii()
             elif cmd == 'binary':
                 client.set_binary()
+            elif cmd == 'buffer':
+                client.set_buffer(command[len('buffer'):].strip())
             elif cmd == 'prompt':
                 client.toggle_prompt()
+            elif cmd == 'progress':
+                client.toggle_progress()
             elif cmd == 'ls':
                 client.ls()
             elif cmd == 'cd':
@@ -1087,6 +3347,11 @@ def main():
                     print("[ERROR] Missing file name for 'delete'")
                 else:
                     client.delete(parts[1])
+            elif cmd == 'mdelete':
+                if len(parts) < 2:
+                    print("[ERROR] Missing file names for 'mdelete'")
+                else:
+                    client.mdelete(parts[1:])
             elif cmd == 'rename':
                 if len(parts) < 3:
                     print("[ERROR] Usage: rename <from> <to>")
@@ -1110,6 +3375,18 @@ def main():
                     print("[ERROR] Missing pattern for 'mput'")
                 else:
                     client.mput(args)
+            elif cmd == 'sync':
+                args = command[len('sync'):].strip()
+                if not args:
+                    print("[ERROR] Missing folder for 'sync'")
+                else:
+                    client.sync(args)
+            elif cmd == 'mirror':
+                args = command[len('mirror'):].strip()
+                if not args:
+                    print("[ERROR] Missing folder for 'mirror'")
+                else:
+                    client.mirror(args)
             elif cmd == 'mget':
                 args = command[len('mget'):].strip()
                 if not args:
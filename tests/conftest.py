@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Các module nằm trong source_code/ (không phải package), thêm vào sys.path cho các test
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'source_code'))
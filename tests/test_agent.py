@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+
+import pytest
+
+import clamav_agent
+
+EICAR = clamav_agent.FakeScanner.SIGNATURE
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(clamav_agent, 'VERDICT_CACHE_FILE', '')
+    monkeypatch.setattr(clamav_agent, 'engine', clamav_agent.FakeScanner())
+    server = clamav_agent.AgentServer()
+    yield server
+    server.executor.shutdown()
+    server.io_executor.shutdown()
+    server.cache.writer.shutdown()
+
+
+def run(agent, client):
+    """Serves agent on an ephemeral port and runs `client(port)` against it."""
+    async def main():
+        agent.scan_slots = asyncio.Semaphore(clamav_agent.MAX_WORKERS)
+        agent.stream_slots = asyncio.Semaphore(clamav_agent.MAX_ENGINE_STREAMS)
+        server = await asyncio.start_server(agent.handle_client, '127.0.0.1', 0)
+        async with server:
+            return await client(server.sockets[0].getsockname()[1])
+    return asyncio.run(main())
+
+
+async def exchange(port, *messages):
+    """Sends each message after the agent's previous reply; returns all replies."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    replies = []
+    try:
+        for message in messages:
+            writer.write(message)
+            await writer.drain()
+            replies.append((await reader.read(1024)).decode())
+    finally:
+        writer.close()
+    return replies
+
+
+def upload(name, data):
+    return (f"{name}:{len(data)}".encode(), data)
+
+
+def test_version(agent):
+    assert run(agent, lambda port: exchange(port, b"VERSION")) == ["fake/1"]
+
+
+def test_hash_probe_after_scan(agent):
+    data = b"x" + EICAR
+    probe = f"HASH {hashlib.sha256(data).hexdigest()} {len(data)}".encode()
+
+    async def client(port):
+        first = await exchange(port, probe, *upload('a.txt', data))
+        second = await exchange(port, probe)
+        return first, second
+
+    first, second = run(agent, client)
+    assert first == ["UNKNOWN", "META_OK", "INFECTED"]
+    assert second == ["INFECTED"]
+
+
+def test_legacy_filename_starting_with_hash(agent):
+    # Client cũ gửi thẳng "filename:size"; tên file bắt đầu bằng "HASH " không phải là câu hỏi HASH
+    replies = run(agent, lambda port: exchange(port, *upload('HASH notes.txt', b"hello")))
+    assert replies == ["META_OK", "OK"]
+
+
+def test_busy_when_admission_is_full(agent, monkeypatch):
+    monkeypatch.setattr(clamav_agent, 'MAX_QUEUE', 0)
+    agent.admitted = clamav_agent.MAX_WORKERS
+    replies = run(agent, lambda port: exchange(port, b"a.txt:5"))
+    assert replies == [f"BUSY: retry after {clamav_agent.BUSY_RETRY_AFTER}"]
+    # Một upload xong thì có chỗ trở lại
+    agent.admitted -= 1
+    assert run(agent, lambda port: exchange(port, *upload('a.txt', b"hello"))) == ["META_OK", "OK"]
+
+
+def test_busy_when_too_many_connections(agent, monkeypatch):
+    monkeypatch.setattr(clamav_agent, 'MAX_CONNECTIONS', 0)
+    replies = run(agent, lambda port: exchange(port, b"a.txt:5"))
+    assert replies == [f"BUSY: retry after {clamav_agent.BUSY_RETRY_AFTER}"]
+    assert agent.connections == 0
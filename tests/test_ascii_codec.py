@@ -0,0 +1,29 @@
+import pytest
+
+from ftp_client import AsciiCodec
+
+
+def convert_all(direction, chunks):
+    codec = AsciiCodec(direction)
+    return b''.join(codec.convert(chunk) for chunk in chunks) + codec.flush()
+
+
+def test_decode_crlf():
+    assert convert_all('decode', [b'a\r\nb\r\n']) == b'a\nb\n'
+
+
+def test_decode_cr_split_across_chunks():
+    assert convert_all('decode', [b'a\r', b'\nb\r', b'\n']) == b'a\nb\n'
+
+
+def test_decode_keeps_lone_cr():
+    assert convert_all('decode', [b'a\r', b'b\r']) == b'a\rb\r'
+
+
+def test_encode_does_not_double_crlf():
+    assert convert_all('encode', [b'a\nb\r', b'\nc']) == b'a\r\nb\r\nc'
+
+
+def test_rejects_unknown_direction():
+    with pytest.raises(ValueError):
+        AsciiCodec('upload')
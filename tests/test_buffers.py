@@ -0,0 +1,48 @@
+import clamav_agent
+import ftp_client
+from ftp_client import BUFFER_SIZE, RawFTPClient
+
+
+def load(monkeypatch, tmp_path, settings):
+    # load_config đọc config.ini cạnh ftp_client.py
+    (tmp_path / 'config.ini').write_text(
+        "[DEFAULT]\nclamav_host = 127.0.0.1\nclamav_port = 6789\n"
+        "local_scan_cache = no\ntransfer_journal = no\n" + settings)
+    monkeypatch.setattr(ftp_client, '__file__', str(tmp_path / 'ftp_client.py'))
+    client = RawFTPClient()
+    client.load_config()
+    return client
+
+
+def test_config_sizes_are_read(monkeypatch, tmp_path):
+    client = load(monkeypatch, tmp_path, "chunk_size_kb = 128\nmax_chunk_size_kb = 2048\nsocket_buffer_kb = 256\n")
+    assert (client.chunk_size, client.max_chunk_size, client.socket_buffer) == (128 * 1024, 2048 * 1024, 256 * 1024)
+
+
+def test_zero_chunk_size_in_config_keeps_defaults(monkeypatch, tmp_path):
+    client = load(monkeypatch, tmp_path, "chunk_size_kb = 0\n")
+    assert client.chunk_size == BUFFER_SIZE
+    client = load(monkeypatch, tmp_path, "max_chunk_size_kb = 0\n")
+    assert client.chunk_size == BUFFER_SIZE and client.max_chunk_size > 0
+
+
+def test_buffer_command_rejects_zero_without_changing_settings():
+    client = RawFTPClient()
+    client.set_buffer("0 64")
+    assert (client.chunk_size, client.socket_buffer) == (BUFFER_SIZE, 0)
+    client.set_buffer("32 -1")
+    assert client.chunk_size == BUFFER_SIZE
+    client.set_buffer("32 64")
+    assert (client.chunk_size, client.socket_buffer) == (32 * 1024, 64 * 1024)
+
+
+def test_agent_env_sizes(monkeypatch):
+    monkeypatch.delenv('CLAMAV_AGENT_RECV_KB', raising=False)
+    assert clamav_agent.env_kb('CLAMAV_AGENT_RECV_KB', 64) == 64 * 1024
+    for value in ('0', '-8', 'abc'):
+        monkeypatch.setenv('CLAMAV_AGENT_RECV_KB', value)
+        assert clamav_agent.env_kb('CLAMAV_AGENT_RECV_KB', 64) == 64 * 1024
+    monkeypatch.setenv('CLAMAV_AGENT_RECV_KB', '16')
+    assert clamav_agent.env_kb('CLAMAV_AGENT_RECV_KB', 64) == 16 * 1024
+    monkeypatch.setenv('CLAMAV_AGENT_SOCKET_BUFFER_KB', '0')
+    assert clamav_agent.env_kb('CLAMAV_AGENT_SOCKET_BUFFER_KB', 0, minimum=0) == 0
@@ -0,0 +1,39 @@
+from ftp_client import parse_list_line, parse_mlsx_line
+
+
+def test_parse_mlsx_line_name_with_spaces():
+    entry = parse_mlsx_line('type=file;size=12;modify=20240101120000.5;unique=8U1; my file .txt')
+    assert entry.name == 'my file .txt'
+    assert entry.type == 'file'
+    assert entry.size == 12
+    assert entry.modify == '20240101120000'
+    assert entry.unique == '8U1'
+
+
+def test_parse_mlsx_line_dir_and_invalid():
+    assert parse_mlsx_line('Type=DIR;Modify=20240101120000; sub dir').is_dir
+    assert parse_mlsx_line('no-facts') is None
+
+
+def test_parse_list_line_unix():
+    entry = parse_list_line('-rw-r--r--   1 ftp ftp   12 Jan 01 12:00 a b.txt')
+    assert (entry.name, entry.type, entry.size) == ('a b.txt', 'file', 12)
+    assert parse_list_line('drwxr-xr-x 2 ftp ftp 4096 Jan 01  2024 sub dir').is_dir
+    link = parse_list_line('lrwxrwxrwx 1 ftp ftp 4 Jan 01 12:00 my link -> target')
+    assert (link.name, link.type) == ('my link', 'link')
+    assert parse_list_line('total 8') is None
+
+
+def test_parse_list_line_dos():
+    entry = parse_list_line('01-01-24  12:00PM       <DIR>          my dir')
+    assert (entry.name, entry.type, entry.size) == ('my dir', 'dir', None)
+    entry = parse_list_line('12-31-2023  09:05      1234 a b c d e f g h.txt')
+    assert (entry.name, entry.type, entry.size) == ('a b c d e f g h.txt', 'file', 1234)
+
+
+def test_trailing_spaces_are_part_of_the_name():
+    assert parse_mlsx_line('type=file;size=1; notes.txt ').name == 'notes.txt '
+    # Dòng MLST bắt đầu bằng một dấu cách
+    assert parse_mlsx_line(' type=file;size=1; notes.txt \r\n').name == 'notes.txt '
+    assert parse_list_line('01-01-24  12:00PM  5 notes.txt ').name == 'notes.txt '
+    assert parse_list_line('-rw-r--r-- 1 ftp ftp 5 Jan 01 12:00 notes.txt ').name == 'notes.txt '
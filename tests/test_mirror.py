@@ -0,0 +1,59 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from ftp_client import RawFTPClient, RemoteEntry, TransferJournal
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = RawFTPClient()
+    client.host, client.user = 'ftp.example', 'u'
+    client.remote_dir = '/'
+    client.journal = TransferJournal(str(tmp_path / 'journal.sqlite3'))
+    client.remote_digest = None
+    client.remote_hash = lambda path: client.remote_digest
+    return client
+
+
+def mlsx_time(timestamp):
+    return time.strftime('%Y%m%d%H%M%S', time.gmtime(timestamp))
+
+
+@pytest.fixture
+def local(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'hello')
+    os.utime(path, (1700000000, 1700000000))
+    return str(path)
+
+
+def test_missing_or_resized_local_copy(client, tmp_path, local):
+    assert client._needs_download('a.txt', str(tmp_path / 'missing.txt'), RemoteEntry('a.txt', size=5))
+    assert client._needs_download('a.txt', local, RemoteEntry('a.txt', size=6))
+
+
+def test_interrupted_download_is_fetched_again(client, local):
+    client.journal.start_partial(client._server_id(), 'get', '/a.txt', local)
+    assert client._needs_download('a.txt', local, RemoteEntry('a.txt', size=5, modify=mlsx_time(1700000000)))
+
+
+def test_same_modify_time_is_skipped(client, local):
+    assert not client._needs_download('a.txt', local, RemoteEntry('a.txt', size=5, modify=mlsx_time(1700000000)))
+
+
+def test_checksum_decides_when_modify_times_differ(client, local):
+    entry = RemoteEntry('a.txt', size=5, modify=mlsx_time(1700003600))
+    client.remote_digest = ('sha256', hashlib.sha256(b'hello').hexdigest())
+    assert not client._needs_download('a.txt', local, entry)
+    client.remote_digest = ('sha256', hashlib.sha256(b'HELLO').hexdigest())
+    assert client._needs_download('a.txt', local, entry)
+    # Không có checksum: modify khác nghĩa là file đã đổi
+    client.remote_digest = None
+    assert client._needs_download('a.txt', local, entry)
+
+
+def test_plain_list_compares_sizes_only(client, local):
+    assert not client._needs_download('a.txt', local, RemoteEntry('a.txt', size=5))
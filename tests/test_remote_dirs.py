@@ -0,0 +1,49 @@
+import pytest
+
+from ftp_client import FTPReply, RawFTPClient
+
+
+@pytest.fixture
+def client():
+    client = RawFTPClient()
+    client.remote_dir = '/home'
+    client.sent = []
+    client.replies = {}
+
+    def send_pipelined(commands):
+        client.sent.append(commands)
+        return [client.replies.get(command, FTPReply(257, [f'257 "{command[4:]}" created']))
+                for command in commands]
+
+    client._send_pipelined = send_pipelined
+    return client
+
+
+def test_all_levels_are_created_in_one_batch(client):
+    client.make_remote_dirs('a/b/c')
+    assert client.sent == [['MKD a', 'MKD a/b', 'MKD a/b/c']]
+    assert {'/home/a', '/home/a/b', '/home/a/b/c'} <= client.known_dirs
+
+
+def test_known_dirs_are_not_created_again(client):
+    client.make_remote_dirs('a/b')
+    client.make_remote_dirs('a/b')
+    client.make_remote_dirs('a/b/c/d')
+    assert client.sent == [['MKD a', 'MKD a/b'], ['MKD a/b/c', 'MKD a/b/c/d']]
+
+
+def test_absolute_paths_use_their_own_prefix(client):
+    client.known_dirs.add('/data')
+    client.make_remote_dirs('/data/x')
+    assert client.sent == [['MKD /data/x']]
+
+
+def test_existing_and_failed_dirs(client, capsys):
+    client.replies['MKD a'] = FTPReply(550, ['550 a: File exists'])
+    client.replies['MKD a/b'] = FTPReply(550, ['550 Permission denied'])
+    client.replies['MKD a/b/c'] = FTPReply(421, ['421 Too many users'])
+    client.make_remote_dirs('a/b/c')
+    # "exists" cho biết thư mục đã có; 550 chung chung thì không ghi nhớ (STOR sẽ cho biết sau)
+    assert '/home/a' in client.known_dirs
+    assert '/home/a/b' not in client.known_dirs
+    assert "[WARN] Failed to create remote dir 'a/b/c'" in capsys.readouterr().out
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from ftp_client import AsyncFTPClient
+
+
+def read_replies(data, count=1):
+    async def run():
+        client = AsyncFTPClient()
+        client.reader = asyncio.StreamReader()
+        client.reader.feed_data(data)
+        client.reader.feed_eof()
+        return [await client.read_reply() for _ in range(count)]
+    return asyncio.run(run())
+
+
+def test_single_line_reply():
+    reply, = read_replies(b'200 Type set to I.\r\n')
+    assert reply.code == 200
+    assert reply.text == '200 Type set to I.'
+
+
+def test_multi_line_reply():
+    data = (b'211-Features:\r\n'
+            b' MLST type*;size*;modify*;\r\n'
+            b'211-not the end\r\n'
+            b' UTF8\r\n'
+            b'211 End\r\n'
+            b'230 Logged in.\r\n')
+    feat, login = read_replies(data, 2)
+    assert feat.code == 211
+    assert feat.lines == ['211-Features:', ' MLST type*;size*;modify*;', '211-not the end', ' UTF8', '211 End']
+    assert login.code == 230
+
+
+def test_reply_without_code():
+    reply, = read_replies(b'garbage\r\n')
+    assert reply.code == 0
+
+
+def test_reply_connection_closed():
+    with pytest.raises(ConnectionError):
+        read_replies(b'220 partial')
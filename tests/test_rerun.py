@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from ftp_client import RawFTPClient, TransferJournal
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = RawFTPClient()
+    client.host, client.user = 'ftp.example', 'u'
+    client.remote_dir = '/'
+    client.journal = TransferJournal(str(tmp_path / 'journal.sqlite3'))
+    client.remote_sizes = {}
+    client.remote_size = lambda path: client.remote_sizes.get(path)
+    return client
+
+
+def test_mput_skips_journaled_unchanged_upload(client, tmp_path):
+    local = tmp_path / 'a.bin'
+    local.write_bytes(b'x' * 10)
+    assert not client._uploaded_before(str(local), 'docs')
+    stat = os.stat(local)
+    client.journal.record_upload(client._server_id(), '/docs/a.bin', stat.st_size, stat.st_mtime_ns, None)
+    client.remote_sizes['docs/a.bin'] = 10
+    assert client._uploaded_before(str(local), 'docs')
+    # File trên server đã bị xóa: phải upload lại
+    del client.remote_sizes['docs/a.bin']
+    assert not client._uploaded_before(str(local), 'docs')
+    # File cục bộ đã đổi kể từ lần upload trước
+    client.remote_sizes['docs/a.bin'] = 10
+    os.utime(local, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not client._uploaded_before(str(local), 'docs')
+
+
+def test_mget_skips_complete_local_copy(client, tmp_path):
+    local = tmp_path / 'a.bin'
+    assert not client._downloaded_before('a.bin', str(local), 10)
+    local.write_bytes(b'x' * 10)
+    assert client._downloaded_before('a.bin', str(local), 10)
+    assert not client._downloaded_before('a.bin', str(local), 20)
+    client.remote_sizes['a.bin'] = 10
+    assert client._downloaded_before('a.bin', str(local), None)
+
+
+def test_mget_does_not_skip_interrupted_download(client, tmp_path):
+    local = tmp_path / 'a.bin'
+    local.write_bytes(b'x' * 10)
+    client.journal.start_partial(client._server_id(), 'get', '/a.bin', str(local))
+    assert not client._downloaded_before('a.bin', str(local), 10)
+    client.transfer_mode = 'ascii'
+    client.journal = None
+    assert not client._downloaded_before('a.bin', str(local), 10)
@@ -0,0 +1,20 @@
+from ftp_client import LocalScanCache
+
+
+def test_lookup(tmp_path):
+    cache = LocalScanCache(str(tmp_path / 'scan.sqlite3'))
+    cache.store('/x/a.txt', 10, 111, 'a' * 64, 'v1', 'OK')
+    cache.store('/x/b.txt', 10, 111, 'b' * 64, 'v1', 'ERROR')
+    assert cache.lookup('/x/a.txt', 10, 111, 'v1') == ('OK', 'a' * 64)
+    assert cache.lookup('/x/a.txt', 10, 222, 'v1') is None  # mtime đổi
+    assert cache.lookup('/x/b.txt', 10, 111, 'v1') is None
+    assert cache.lookup_hash('a' * 64, 'v1') == 'OK'
+
+
+def test_version_change_clears(tmp_path):
+    cache = LocalScanCache(str(tmp_path / 'scan.sqlite3'))
+    cache.store('/x/a.txt', 10, 111, 'a' * 64, 'v1', 'OK')
+    cache.store('/x/c.txt', 5, 111, 'c' * 64, 'v2', 'INFECTED')
+    assert cache.lookup('/x/a.txt', 10, 111, 'v1') is None
+    assert cache.lookup_hash('a' * 64, 'v1') is None
+    assert cache.lookup_hash('c' * 64, 'v2') == 'INFECTED'
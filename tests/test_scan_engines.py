@@ -0,0 +1,24 @@
+import clamav_agent
+
+
+def test_fake_scanner_scan_file(tmp_path):
+    engine = clamav_agent.create_engine('fake')
+    clean = tmp_path / 'clean.txt'
+    clean.write_bytes(b'hello')
+    infected = tmp_path / 'eicar.txt'
+    infected.write_bytes(b'x' + engine.SIGNATURE)
+    assert engine.scan_file(str(clean)) == 'OK'
+    assert engine.scan_file(str(infected)) == 'INFECTED'
+    assert engine.scan_file(str(tmp_path / 'missing')).startswith('ERROR')
+
+
+def test_fake_stream_signature_split_across_chunks():
+    engine = clamav_agent.FakeScanner()
+    stream = engine.open_stream()
+    signature = engine.SIGNATURE
+    stream.write(b'x' * 100 + signature[:10])
+    stream.write(signature[10:] + b'y')
+    assert stream.finish() == 'INFECTED'
+    clean = engine.open_stream()
+    clean.write(b'x' * 100)
+    assert clean.finish() == 'OK'
@@ -0,0 +1,72 @@
+import threading
+
+from ftp_client import RawFTPClient, TransferJournal, split_ranges
+
+DATA = bytes(range(100))
+
+
+def test_split_fresh_download():
+    ranges, missing, seg_len = split_ranges([], 100, 4)
+    assert ranges == [(0, 25), (25, 50), (50, 75), (75, 100)]
+    assert (missing, seg_len) == (100, 25)
+
+
+def test_split_only_missing_bytes():
+    done = [(0, 24), (25, 26), (50, 51), (75, 76)]
+    ranges, missing, seg_len = split_ranges(done, 100, 4)
+    assert missing == 73
+    assert all(end - start <= seg_len for start, end in ranges)
+    covered = set()
+    for start, end in ranges:
+        assert not covered & set(range(start, end))
+        covered |= set(range(start, end))
+    assert covered == set(range(100)) - {b for s, e in done for b in range(s, e)}
+
+
+def test_split_complete_file():
+    assert split_ranges([(0, 100)], 100, 4)[0] == []
+
+
+class FakeSession:
+    """Stands in for a cloned session: writes DATA[start:end] into the local file."""
+
+    def __init__(self, fetched):
+        self.fetched = fetched
+
+    def _fetch_range(self, filename, local_path, start, end, progress=None):
+        with open(local_path, 'r+b') as f:
+            f.seek(start)
+            f.write(DATA[start:end])
+        self.fetched.append((start, end))
+        return end
+
+    def disconnect(self):
+        pass
+
+
+def test_segmented_get_resumes_with_at_most_segments_sessions(tmp_path):
+    local_path = str(tmp_path / 'big.bin')
+    with open(local_path, 'wb') as f:
+        f.write(DATA[:76])
+    client = RawFTPClient()
+    client.host, client.user, client.remote_dir = 'ftp.example', 'u', '/'
+    client.journal = TransferJournal(str(tmp_path / 'journal.sqlite3'))
+    resume_key = (client._server_id(), 'get', '/big.bin', local_path)
+    for start, end in [(0, 24), (25, 26), (50, 51), (75, 76)]:
+        client.journal.record_range(resume_key[0], '/big.bin', local_path, 100, start, end)
+
+    fetched, clones = [], []
+    lock = threading.Lock()
+
+    def clone_session(cwd=None):
+        with lock:
+            clones.append(cwd)
+        return FakeSession(fetched)
+
+    client.remote_cwd = lambda: '/'
+    client.clone_session = clone_session
+    assert client._segmented_get('big.bin', local_path, 100, 4, quiet=True, resume_key=resume_key)
+    assert len(clones) <= 4
+    assert len(fetched) == 7
+    assert open(local_path, 'rb').read() == DATA
+    assert client.journal.lookup_partial(*resume_key) is None
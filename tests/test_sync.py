@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+from ftp_client import RawFTPClient, RemoteEntry, TransferJournal, file_sha256
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = RawFTPClient()
+    client.host, client.user = 'ftp.example', 'u'
+    client.remote_dir = '/'
+    client.journal = TransferJournal(str(tmp_path / 'journal.sqlite3'))
+    return client
+
+
+def mlsx_time(timestamp):
+    return time.strftime('%Y%m%d%H%M%S', time.gmtime(timestamp))
+
+
+def write(path, data, mtime):
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def record(client, local_path, remote_path):
+    stat = os.stat(local_path)
+    client.journal.record_upload(client._server_id(), client._abs_remote(remote_path),
+                                 stat.st_size, stat.st_mtime_ns, file_sha256(local_path))
+
+
+def test_missing_or_resized_remote_file(client, tmp_path):
+    local = write(tmp_path / 'a.txt', b'hello', time.time())
+    assert client._needs_upload(local, 'a.txt', None)
+    assert client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=4))
+
+
+def test_unchanged_journaled_upload_is_skipped(client, tmp_path):
+    now = int(time.time())
+    local = write(tmp_path / 'a.txt', b'hello', now)
+    record(client, local, 'a.txt')
+    assert not client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=5, modify=mlsx_time(now)))
+    os.utime(local, (now + 60, now + 60))  # touch, cùng nội dung
+    assert not client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=5, modify=mlsx_time(now)))
+
+
+def test_same_size_edit_with_older_mtime_is_uploaded(client, tmp_path):
+    now = int(time.time())
+    local = write(tmp_path / 'a.txt', b'hello', now)
+    record(client, local, 'a.txt')
+    # Sửa nội dung, giữ kích thước, mtime cũ hơn file trên server (cp -p, tar, rsync -t)
+    write(tmp_path / 'a.txt', b'HELLO', now - 3600)
+    assert client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=5, modify=mlsx_time(now)))
+
+
+def test_without_journal_modify_times_decide(client, tmp_path):
+    client.journal = None
+    now = int(time.time())
+    local = write(tmp_path / 'a.txt', b'hello', now - 3600)
+    assert not client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=5, modify=mlsx_time(now)))
+    assert client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=5, modify=mlsx_time(now - 7200)))
+    assert client._needs_upload(local, 'a.txt', RemoteEntry('a.txt', size=5))
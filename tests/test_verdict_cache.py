@@ -0,0 +1,41 @@
+import clamav_agent
+
+
+def test_survives_restart(tmp_path):
+    path = str(tmp_path / 'verdicts.jsonl')
+    cache = clamav_agent.VerdictCache(path)
+    cache.set_version('ClamAV 1.0/100')
+    cache.put('a' * 64, 'INFECTED')
+    cache.put('b' * 64, 'ERROR: not cached')
+    cache.flush()
+
+    reloaded = clamav_agent.VerdictCache(path)
+    assert reloaded.version == 'ClamAV 1.0/100'
+    assert reloaded.get('a' * 64) == 'INFECTED'
+    assert reloaded.get('b' * 64) is None
+
+
+def test_version_change_clears(tmp_path):
+    path = str(tmp_path / 'verdicts.jsonl')
+    cache = clamav_agent.VerdictCache(path)
+    cache.set_version('v1')
+    cache.put('a' * 64, 'OK')
+    cache.set_version(None)  # Engine không trả lời: giữ nguyên cache
+    assert cache.get('a' * 64) == 'OK'
+    cache.set_version('v2')
+    assert cache.get('a' * 64) is None
+    cache.flush()
+    assert clamav_agent.VerdictCache(path).get('a' * 64) is None
+
+
+def test_lru_and_ttl():
+    cache = clamav_agent.VerdictCache('', max_entries=2, ttl=60)
+    cache.set_version('v1')
+    cache.put('a', 'OK')
+    cache.put('b', 'OK')
+    cache.get('a')
+    cache.put('c', 'OK')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'OK'
+    cache.entries['a'] = ('OK', 0)
+    assert cache.get('a') is None